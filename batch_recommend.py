@@ -0,0 +1,58 @@
+import argparse
+import asyncio
+import sys
+import time
+
+import shl_backend
+
+
+def read_batch(path):
+    with open(path, "r") as f:
+        records, skipped = shl_backend.parse_batch_lines(f)
+    for line_number in skipped:
+        print(f"Skipping line {line_number}: no query", file=sys.stderr)
+    return records
+
+
+async def run_batch(search_system, records, output, chunk_size, max_parallel_searches):
+    started = time.perf_counter()
+    completed = 0
+    async for index, results, error in search_system.abatch_search_multiple_skills(
+            [query for _, query in records],
+            final_limit=10,
+            max_parallel_searches=max_parallel_searches,
+            chunk_size=chunk_size):
+        output.write(shl_backend.batch_line(records[index][0], index, results, error))
+        output.flush()
+        completed += 1
+        if completed % 100 == 0:
+            print(f"Completed {completed}/{len(records)} queries", file=sys.stderr)
+    elapsed = time.perf_counter() - started
+    print(f"Completed {completed} queries in {elapsed:.1f}s", file=sys.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Recommend assessments for a JSONL file of job descriptions.")
+    parser.add_argument("input", help="JSONL with a query (or title/body) per line")
+    parser.add_argument("--output", help="NDJSON output path (default: stdout)")
+    parser.add_argument("--chunk-size", type=int, default=256)
+    parser.add_argument("--max-parallel-searches", type=int, default=16)
+    args = parser.parse_args()
+
+    records = read_batch(args.input)
+    # Configured from the same environment variables as shl_backend.
+    search_system = shl_backend.create_search_system()
+    search_system.warm_up()
+    try:
+        output = open(args.output, "w") if args.output else sys.stdout
+        try:
+            asyncio.run(run_batch(search_system, records, output, args.chunk_size, args.max_parallel_searches))
+        finally:
+            if output is not sys.stdout:
+                output.close()
+    finally:
+        search_system.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,290 @@
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import resource
+import subprocess
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from shl1 import AssessmentSearchSystem, TEST_TYPES
+from llm_cache import LLMCache
+from embedding_cache import EmbeddingCache
+from local_index import LocalVectorIndex
+
+QUERIES = [
+    "Java developer who can collaborate with business teams, under 40 minutes",
+    "Mid-level professional proficient in Python, SQL and JavaScript",
+    "Analyst with cognitive and personality tests, about an hour",
+    "Entry-level sales role, English speaking, good communication",
+    "Content writer with SEO skills, assessment within 30-40 mins",
+    "QA engineer with Selenium and manual testing experience",
+    "Bank administrative assistant, numerical and verbal ability",
+    "Senior data scientist with machine learning and statistics",
+]
+
+
+class StandInResponse:
+    def __init__(self, text):
+        self.text = text
+
+
+class StandInGemini:
+    def __init__(self, latency=0.05):
+        self.latency = latency
+
+    def _respond(self, prompt):
+        if "Respond with JSON only" in prompt:
+            skills = ["Java", "SQL", "Communication", "Teamwork"]
+            return StandInResponse(json.dumps({
+                "skills": [
+                    {"skill": skill, "refined_query": f"Assessment of {skill} skills", "test_types": ["Knowledge & Skills"]}
+                    for skill in skills
+                ],
+                "constraints": {"assessment_length": "<=60", "languages": [], "job_levels": []}
+            }))
+        if "comma-separated list" in prompt:
+            return StandInResponse("Java, SQL, Communication, Teamwork")
+        query = prompt.split("the user query is", 1)[-1].split("\n", 1)[0].strip()
+        return StandInResponse(
+            f"Name: {query}\n"
+            f"Description: assessment of {query}\n"
+            "Test Type: Knowledge & Skills\n"
+            "Job Levels: Mid-Professional\n"
+            "Languages: English (USA)"
+        )
+
+    def generate_content(self, prompt, generation_config=None):
+        time.sleep(self.latency)
+        return self._respond(prompt)
+
+    async def generate_content_async(self, prompt, generation_config=None):
+        await asyncio.sleep(self.latency)
+        return self._respond(prompt)
+
+
+class StandInEmbeddingModel:
+    def __init__(self, dimension=384):
+        self.dimension = dimension
+
+    def get_sentence_embedding_dimension(self):
+        return self.dimension
+
+    def encode(self, texts, batch_size=32, convert_to_numpy=True):
+        single = isinstance(texts, str)
+        if single:
+            texts = [texts]
+        embeddings = np.zeros((len(texts), self.dimension), dtype=np.float32)
+        for i, text in enumerate(texts):
+            for token in text.lower().split():
+                bucket = int(hashlib.md5(token.encode("utf-8")).hexdigest(), 16) % self.dimension
+                embeddings[i, bucket] += 1.0
+        return embeddings[0] if single else embeddings
+
+
+def synthetic_catalog(embedding_model, size, seed=0, quantization=None):
+    rng = np.random.default_rng(seed)
+    skills = ["Java", "Python", "SQL", "JavaScript", "Selenium", "SEO", "Sales", "Numerical",
+              "Verbal", "Teamwork", "Communication", "Statistics", "Excel", ".NET MVC"]
+    documents = []
+    for i in range(size):
+        skill = skills[i % len(skills)]
+        documents.append({
+            "name": f"{skill} Assessment {i}",
+            "url": f"https://example.com/assessments/{i}",
+            "remote_testing": "Yes",
+            "adaptive": "No",
+            "test_type": [TEST_TYPES[int(rng.integers(len(TEST_TYPES)))]],
+            "description": f"Measures {skill} knowledge and applied {skill} skills.",
+            "job_levels": ["Mid-Professional"],
+            "languages": ["English (USA)"],
+            "assessment_length": float(rng.integers(5, 90)),
+        })
+    texts = [f"{doc['name']} {doc['description']}" for doc in documents]
+    return LocalVectorIndex(embedding_model.encode(texts), documents, quantization=quantization)
+
+
+def build_system(args):
+    started = time.perf_counter()
+    if args.real_model:
+        from sentence_transformers import SentenceTransformer
+        embedding_model = SentenceTransformer('all-MiniLM-L6-v2')
+    else:
+        embedding_model = StandInEmbeddingModel()
+    model_load = time.perf_counter() - started
+
+    system = AssessmentSearchSystem(
+        None,
+        gemini_model=StandInGemini(args.llm_latency),
+        embedding_model=embedding_model,
+        llm_cache=LLMCache() if args.cache else LLMCache(max_entries=0),
+        embedding_cache=EmbeddingCache() if args.cache else EmbeddingCache(max_bytes=0),
+        index_backend="local",
+        local_index=synthetic_catalog(embedding_model, args.catalog_size, quantization=args.quantization),
+        llm_requests_per_minute=10 ** 9,
+        llm_burst=10 ** 9,
+        llm_mode=args.llm_mode,
+        structured_llm=not args.no_structured_llm,
+        hybrid_search=not args.no_hybrid,
+    )
+    system.warm_up()
+    return system, model_load
+
+
+def summarize(latencies, wall_time):
+    latencies = np.array(latencies) * 1000.0
+    return {
+        "requests": len(latencies),
+        "p50_ms": float(np.percentile(latencies, 50)),
+        "p95_ms": float(np.percentile(latencies, 95)),
+        "p99_ms": float(np.percentile(latencies, 99)),
+        "mean_ms": float(latencies.mean()),
+        "throughput_rps": len(latencies) / wall_time if wall_time else 0.0,
+    }
+
+
+def run_threaded(fn, requests, concurrency):
+    def timed(i):
+        started = time.perf_counter()
+        fn(QUERIES[i % len(QUERIES)])
+        return time.perf_counter() - started
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        latencies = list(executor.map(timed, range(requests)))
+    return summarize(latencies, time.perf_counter() - started)
+
+
+async def run_async(fn, requests, concurrency):
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def timed(i):
+        async with semaphore:
+            started = time.perf_counter()
+            await fn(QUERIES[i % len(QUERIES)])
+            return time.perf_counter() - started
+
+    started = time.perf_counter()
+    latencies = await asyncio.gather(*[timed(i) for i in range(requests)])
+    return summarize(latencies, time.perf_counter() - started)
+
+
+async def run_api(system, requests, concurrency):
+    import httpx
+    import shl_backend
+
+    shl_backend.app.state.search_system = system
+    # QUERIES repeats, so with the response cache on nearly every request
+    # would be a hit; measure the search path like the other rows do.
+    cache_ttl = shl_backend.response_cache_ttl
+    shl_backend.response_cache_ttl = 0
+    cache_status = {}
+    transport = httpx.ASGITransport(app=shl_backend.app)
+    try:
+        async with httpx.AsyncClient(transport=transport, base_url="http://benchmark") as client:
+            async def post(query):
+                response = await client.post("/recommend", json={"query": query})
+                response.raise_for_status()
+                status = response.headers.get("X-Cache", "NONE")
+                cache_status[status] = cache_status.get(status, 0) + 1
+
+            stats = await run_async(post, requests, concurrency)
+    finally:
+        shl_backend.response_cache_ttl = cache_ttl
+    stats["cache_status"] = cache_status
+    return stats
+
+
+def run_benchmarks(args):
+    system, model_load = build_system(args)
+    report = {
+        "commit": git_commit(),
+        "config": {
+            "requests": args.requests,
+            "concurrency": args.concurrency,
+            "llm_latency": args.llm_latency,
+            "catalog_size": args.catalog_size,
+            "real_model": args.real_model,
+            "cache": args.cache,
+            "llm_mode": args.llm_mode,
+            "structured_llm": not args.no_structured_llm,
+            "hybrid_search": not args.no_hybrid,
+            "quantization": args.quantization,
+        },
+        "model_load_s": model_load,
+        "results": {},
+    }
+    for concurrency in args.concurrency:
+        results = {
+            "search": run_threaded(lambda q: system.search(q, 10), args.requests, concurrency),
+            "search_multiple_skills": run_threaded(system.search_multiple_skills, args.requests, concurrency),
+            "asearch_multiple_skills": asyncio.run(
+                run_async(system.asearch_multiple_skills, args.requests, concurrency)
+            ),
+            "api_recommend": asyncio.run(run_api(system, args.requests, concurrency)),
+        }
+        report["results"][str(concurrency)] = results
+    # ru_maxrss is reported in kilobytes on Linux.
+    report["peak_rss_mb"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+    system.close()
+    return report
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True).strip()
+    except Exception:
+        return None
+
+
+def print_report(report, baseline=None):
+    print(f"Model load: {report['model_load_s']:.3f}s  Peak RSS: {report['peak_rss_mb']:.1f} MB")
+    for concurrency, results in report["results"].items():
+        print(f"\nConcurrency {concurrency}")
+        print("-" * 50)
+        for name, stats in results.items():
+            line = (f"{name:<26} p50 {stats['p50_ms']:8.1f} ms  p95 {stats['p95_ms']:8.1f} ms  "
+                    f"p99 {stats['p99_ms']:8.1f} ms  {stats['throughput_rps']:8.1f} req/s")
+            if baseline:
+                previous = baseline.get("results", {}).get(concurrency, {}).get(name)
+                if previous and previous["p95_ms"]:
+                    change = (stats["p95_ms"] - previous["p95_ms"]) / previous["p95_ms"] * 100
+                    line += f"  p95 {change:+.1f}% vs baseline"
+            print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=50)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16])
+    parser.add_argument("--llm-latency", type=float, default=0.05)
+    parser.add_argument("--catalog-size", type=int, default=500)
+    parser.add_argument("--real-model", action="store_true")
+    parser.add_argument("--cache", action="store_true")
+    parser.add_argument("--llm-mode", choices=["always", "auto", "off"], default="auto")
+    parser.add_argument("--no-structured-llm", action="store_true")
+    parser.add_argument("--no-hybrid", action="store_true")
+    parser.add_argument("--quantization", choices=["float16", "int8"])
+    parser.add_argument("--save", help="write the report as a JSON baseline")
+    parser.add_argument("--compare", help="JSON baseline to compare against")
+    args = parser.parse_args()
+
+    report = run_benchmarks(args)
+    baseline = None
+    if args.compare:
+        with open(args.compare, "r") as f:
+            baseline = json.load(f)
+    print_report(report, baseline)
+
+    if args.save:
+        os.makedirs(os.path.dirname(args.save) or ".", exist_ok=True)
+        with open(args.save, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nSaved baseline to {args.save}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+import re
+
+import numpy as np
+
+from local_index import DOCUMENT_FIELDS, CatalogFilter, result_document
+
+# Keeps tokens such as ".net", "c#" and "c++" intact.
+TOKEN_PATTERN = re.compile(r'\.?[a-z0-9]+[#+]*')
+
+
+def tokenize(text):
+    return TOKEN_PATTERN.findall(str(text).casefold())
+
+
+def document_text(doc):
+    if doc.get("text"):
+        return doc["text"]
+    parts = []
+    for field in DOCUMENT_FIELDS:
+        value = doc.get(field)
+        if field == "url" or value is None:
+            continue
+        parts.append(" ".join(value) if isinstance(value, list) else str(value))
+    return " ".join(parts)
+
+
+class BM25Index:
+    def __init__(self, texts, k1=1.5, b=0.75):
+        self.vocabulary = {}
+        postings = {}
+        doc_lengths = np.zeros(len(texts), dtype=np.float32)
+        for doc_id, text in enumerate(texts):
+            tokens = tokenize(text)
+            doc_lengths[doc_id] = len(tokens)
+            counts = {}
+            for token in tokens:
+                counts[token] = counts.get(token, 0) + 1
+            for token, count in counts.items():
+                term_id = self.vocabulary.setdefault(token, len(self.vocabulary))
+                postings.setdefault(term_id, []).append((doc_id, count))
+
+        # Postings in CSR form: the documents for term t are
+        # doc_ids[offsets[t]:offsets[t + 1]], with their precomputed weights.
+        doc_count = len(texts)
+        average_length = doc_lengths.mean() if doc_count else 0.0
+        self.offsets = np.zeros(len(self.vocabulary) + 1, dtype=np.int64)
+        doc_ids = []
+        weights = []
+        for term_id in range(len(self.vocabulary)):
+            entries = postings[term_id]
+            idf = np.log(1.0 + (doc_count - len(entries) + 0.5) / (len(entries) + 0.5))
+            for doc_id, count in entries:
+                norm = k1 * (1.0 - b + b * doc_lengths[doc_id] / average_length) if average_length else k1
+                doc_ids.append(doc_id)
+                weights.append(idf * count * (k1 + 1.0) / (count + norm))
+            self.offsets[term_id + 1] = len(doc_ids)
+        self.doc_ids = np.array(doc_ids, dtype=np.int32)
+        self.weights = np.array(weights, dtype=np.float32)
+        self.doc_count = doc_count
+
+    def scores(self, query):
+        scores = np.zeros(self.doc_count, dtype=np.float32)
+        for token in set(tokenize(query)):
+            term_id = self.vocabulary.get(token)
+            if term_id is None:
+                continue
+            start, end = self.offsets[term_id], self.offsets[term_id + 1]
+            scores[self.doc_ids[start:end]] += self.weights[start:end]
+        return scores
+
+
+class LexicalIndex:
+    def __init__(self, documents):
+        self.documents = documents
+        self.bm25 = BM25Index([document_text(doc) for doc in documents])
+        self.catalog_filter = CatalogFilter(documents)
+
+    @classmethod
+    def from_collection(cls, collection):
+        projection = {field: 1 for field in DOCUMENT_FIELDS}
+        projection.update({"_id": 0, "text": 1})
+        return cls(list(collection.find({}, projection)))
+
+    def search(self, query, limit, filters=None):
+        scores = self.bm25.scores(query)
+        candidates = np.flatnonzero((scores > 0) & self.catalog_filter.mask(filters))
+        if len(candidates) == 0:
+            return []
+
+        candidate_scores = scores[candidates]
+        k = min(limit, len(candidates))
+        top = np.argpartition(-candidate_scores, k - 1)[:k]
+        top = top[np.argsort(-candidate_scores[top], kind='stable')]
+        return [result_document(self.documents[candidates[i]], float(candidate_scores[i])) for i in top]
+
+
+def reciprocal_rank_fusion(result_lists, limit, k=60):
+    fused = {}
+    documents = {}
+    for results in result_lists:
+        for rank, result in enumerate(results, 1):
+            fused[result["name"]] = fused.get(result["name"], 0.0) + 1.0 / (k + rank)
+            documents.setdefault(result["name"], result)
+
+    ranked = sorted(fused, key=lambda name: fused[name], reverse=True)[:limit]
+    merged = []
+    for name in ranked:
+        result = dict(documents[name])
+        result["score"] = fused[name]
+        merged.append(result)
+    return merged
@@ -0,0 +1,125 @@
+import hashlib
+import json
+import os
+import shutil
+import time
+
+import numpy as np
+
+FORMAT_VERSION = 1
+CURRENT_FILE = "CURRENT"
+MANIFEST_FILE = "manifest.json"
+EMBEDDINGS_FILE = "embeddings.npy"
+METADATA_FILE = "metadata.json"
+
+# Layout under the snapshot root:
+#   CURRENT                      name of the active version
+#   <version>/manifest.json      format, model, counts, file hashes
+#   <version>/embeddings.npy     normalized float32 matrix, loaded memory-mapped
+#   <version>/metadata.json      document fields stored column by column
+# Versions are content hashes, so the same catalog always gets the same
+# version and switching CURRENT is the only mutation of a live snapshot.
+
+
+def file_hash(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def to_columns(documents):
+    fields = list(dict.fromkeys(field for doc in documents for field in doc))
+    return {field: [doc.get(field) for doc in documents] for field in fields}
+
+
+def from_columns(columns):
+    fields = list(columns)
+    # Nulls are kept: documents must round-trip with the same keys as in Mongo.
+    return [dict(zip(fields, values)) for values in zip(*columns.values())]
+
+
+def _fsync_write(path, data):
+    with open(path, "wb") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def read_current(root):
+    try:
+        with open(os.path.join(root, CURRENT_FILE), "r") as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def set_current(root, version):
+    tmp_path = os.path.join(root, f"{CURRENT_FILE}.{os.getpid()}.tmp")
+    _fsync_write(tmp_path, version.encode("utf-8"))
+    os.replace(tmp_path, os.path.join(root, CURRENT_FILE))
+
+
+def write_snapshot(root, matrix, documents, model_name="", make_current=True):
+    os.makedirs(root, exist_ok=True)
+    tmp_dir = os.path.join(root, f".tmp-{os.getpid()}-{time.time_ns()}")
+    os.makedirs(tmp_dir)
+    try:
+        matrix = np.ascontiguousarray(matrix, dtype=np.float32)
+        np.save(os.path.join(tmp_dir, EMBEDDINGS_FILE), matrix)
+        _fsync_write(
+            os.path.join(tmp_dir, METADATA_FILE),
+            json.dumps(to_columns(documents), sort_keys=True).encode("utf-8")
+        )
+        files = {name: file_hash(os.path.join(tmp_dir, name)) for name in (EMBEDDINGS_FILE, METADATA_FILE)}
+        content_hash = hashlib.sha256(
+            json.dumps({"model": model_name, "files": files}, sort_keys=True).encode("utf-8")
+        ).hexdigest()
+        version = content_hash[:16]
+        manifest = {
+            "format_version": FORMAT_VERSION,
+            "version": version,
+            "hash": content_hash,
+            "created": time.time(),
+            "model": model_name,
+            "count": int(matrix.shape[0]),
+            "dimension": int(matrix.shape[1]) if matrix.ndim == 2 else 0,
+            "files": files
+        }
+        _fsync_write(os.path.join(tmp_dir, MANIFEST_FILE), json.dumps(manifest, indent=2).encode("utf-8"))
+
+        version_dir = os.path.join(root, version)
+        if os.path.exists(version_dir):
+            shutil.rmtree(tmp_dir)
+        else:
+            os.rename(tmp_dir, version_dir)
+    except BaseException:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise
+
+    if make_current:
+        set_current(root, version)
+    return version
+
+
+def load_snapshot(root, version=None, mmap=True, verify=False):
+    version = version or read_current(root)
+    if version is None:
+        raise FileNotFoundError(f"No catalog snapshot in {root}")
+    version_dir = os.path.join(root, version)
+    with open(os.path.join(version_dir, MANIFEST_FILE), "r") as f:
+        manifest = json.load(f)
+    if manifest.get("format_version") != FORMAT_VERSION:
+        raise ValueError(f"Unsupported snapshot format: {manifest.get('format_version')}")
+    if verify:
+        for name, expected in manifest["files"].items():
+            if file_hash(os.path.join(version_dir, name)) != expected:
+                raise ValueError(f"Snapshot {version} is corrupt: {name} does not match the manifest")
+
+    matrix = np.load(os.path.join(version_dir, EMBEDDINGS_FILE), mmap_mode='r' if mmap else None)
+    with open(os.path.join(version_dir, METADATA_FILE), "r") as f:
+        documents = from_columns(json.load(f))
+    if len(documents) != manifest["count"] or matrix.shape[0] != manifest["count"]:
+        raise ValueError(f"Snapshot {version} does not match its manifest count")
+    return matrix, documents, manifest
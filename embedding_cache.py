@@ -0,0 +1,147 @@
+import hashlib
+import os
+import re
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+
+class VectorStore:
+    # Append-only file of fixed-size (key, float32 vector) records. It is
+    # memory-mapped once and remapped only after another writer (a forked
+    # worker, say) has grown it.
+    def __init__(self, path, dimension):
+        self.path = path
+        self.dtype = np.dtype([("key", "S64"), ("vector", "<f4", (dimension,))])
+        self.lock = threading.Lock()
+        self.rows = {}
+        self.written = set()
+        self.matrix = None
+        self.fd = os.open(path, os.O_RDWR | os.O_CREAT | os.O_APPEND, 0o644)
+        size = os.fstat(self.fd).st_size
+        if size % self.dtype.itemsize:
+            # Drop a record torn by a crash so later appends stay aligned.
+            os.ftruncate(self.fd, size - size % self.dtype.itemsize)
+        self._remap()
+
+    def _remap(self):
+        count = os.fstat(self.fd).st_size // self.dtype.itemsize
+        mapped = len(self.matrix) if self.matrix is not None else 0
+        if count == mapped:
+            return
+        self.matrix = np.memmap(self.path, dtype=self.dtype, mode='r', shape=(count,))
+        for row, key in enumerate(self.matrix["key"][mapped:].tolist(), mapped):
+            self.rows.setdefault(key, row)
+
+    def get(self, key):
+        key = key.encode("ascii")
+        with self.lock:
+            row = self.rows.get(key)
+            if row is None:
+                self._remap()
+                row = self.rows.get(key)
+            if row is None:
+                return None
+            # A copy, so no cached array pins a mapping that a remap replaced.
+            return np.array(self.matrix["vector"][row])
+
+    def put(self, key, embedding):
+        key = key.encode("ascii")
+        record = np.zeros(1, dtype=self.dtype)
+        record["key"] = key
+        record["vector"] = embedding
+        with self.lock:
+            if key in self.rows or key in self.written:
+                return
+            # One write per record; O_APPEND keeps concurrent writers' records whole.
+            os.write(self.fd, record.tobytes())
+            self.written.add(key)
+
+    def close(self):
+        os.close(self.fd)
+
+
+class EmbeddingCache:
+    def __init__(self, max_bytes=64 * 1024 * 1024, persist_dir=None, model_name=""):
+        self.max_bytes = max_bytes
+        self.persist_dir = persist_dir
+        self.model_name = model_name
+        self.entries = OrderedDict()
+        self.size = 0
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        # One store per embedding dimension, in embeddings-<dimension>.f32.
+        self.stores = {}
+        if persist_dir:
+            os.makedirs(persist_dir, exist_ok=True)
+            for name in sorted(os.listdir(persist_dir)):
+                match = re.fullmatch(r'embeddings-(\d+)\.f32', name)
+                if match:
+                    self._store(int(match.group(1)))
+
+    def key(self, text):
+        return hashlib.sha256(f"{self.model_name}\0{text}".encode("utf-8")).hexdigest()
+
+    def _store(self, dimension):
+        with self.lock:
+            store = self.stores.get(dimension)
+            if store is None:
+                path = os.path.join(self.persist_dir, f"embeddings-{dimension}.f32")
+                store = self.stores[dimension] = VectorStore(path, dimension)
+            return store
+
+    def _put(self, key, embedding):
+        old = self.entries.pop(key, None)
+        if old is not None:
+            self.size -= old.nbytes
+        self.entries[key] = embedding
+        self.size += embedding.nbytes
+        while self.size > self.max_bytes and self.entries:
+            _, evicted = self.entries.popitem(last=False)
+            self.size -= evicted.nbytes
+
+    def get(self, text):
+        key = self.key(text)
+        with self.lock:
+            embedding = self.entries.get(key)
+            if embedding is not None:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return embedding
+            stores = list(self.stores.values())
+        for store in stores:
+            embedding = store.get(key)
+            if embedding is not None:
+                with self.lock:
+                    self._put(key, embedding)
+                    self.hits += 1
+                return embedding
+        with self.lock:
+            self.misses += 1
+        return None
+
+    def set(self, text, embedding):
+        key = self.key(text)
+        embedding = np.ascontiguousarray(embedding, dtype=np.float32)
+        with self.lock:
+            self._put(key, embedding)
+        if self.persist_dir:
+            self._store(embedding.shape[-1]).put(key, embedding)
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "entries": len(self.entries),
+            "bytes": self.size
+        }
+
+    def close(self):
+        with self.lock:
+            stores, self.stores = list(self.stores.values()), {}
+        for store in stores:
+            store.close()
@@ -1,6 +1,11 @@
 import json
-from shl1 import AssessmentSearchSystem
-import time
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+from shl1 import AssessmentSearchSystem, embedding_model_id
+from local_index import LocalVectorIndex
+from query_parser import QueryParser
+from llm_cache import LLMCache
+from embedding_cache import EmbeddingCache
 from dotenv import load_dotenv
 import os
 load_dotenv()
@@ -36,45 +41,107 @@ def calculate_ap(actual, predicted, k):
     
     return running_sum / len(actual) if actual else 0.0
 
-def evaluate_search_system(test_queries, k_values=[5, 10]):
+def build_search_system(mode="live", cache_dir="eval_cache", concurrency=4, llm_mode="auto",
+                        embedding_backend="torch", index_quantization=None):
+    if mode == "live":
+        search_system = AssessmentSearchSystem(
+            mongodb_uri,
+            max_parallel_skills=concurrency,
+            llm_mode=llm_mode,
+            embedding_backend=embedding_backend
+        )
+        search_system.warm_up()
+        return search_system
+
+    os.makedirs(cache_dir, exist_ok=True)
+    llm_cache = LLMCache(ttl=None, sqlite_path=os.path.join(cache_dir, "llm.sqlite"))
+    embedding_cache = EmbeddingCache(
+        persist_dir=os.path.join(cache_dir, "embeddings"),
+        model_name=embedding_model_id('all-MiniLM-L6-v2', embedding_backend)
+    )
+    if mode == "record":
+        search_system = AssessmentSearchSystem(
+            mongodb_uri,
+            llm_cache=llm_cache,
+            embedding_cache=embedding_cache,
+            max_parallel_skills=concurrency,
+            llm_mode=llm_mode,
+            embedding_backend=embedding_backend
+        )
+        search_system.warm_up()
+        # Snapshot the catalog first and parse queries against it exactly as
+        # replay will, so both modes produce the same refined text.
+        snapshot_dir = os.path.join(cache_dir, "catalog")
+        version = search_system.export_snapshot(snapshot_dir)
+        print(f"Recording against catalog snapshot {version}")
+        documents = LocalVectorIndex.from_snapshot(snapshot_dir, version).documents
+        search_system.query_parser = QueryParser.from_documents(documents)
+        return search_system
+    if mode == "replay":
+        # Replaying with --quantization compares recall against the
+        # float32 run from the same recording. Recordings made before
+        # catalog snapshots existed only have the exported index.
+        snapshot_dir = os.path.join(cache_dir, "catalog")
+        return AssessmentSearchSystem(
+            None,
+            llm_cache=llm_cache,
+            embedding_cache=embedding_cache,
+            index_backend="local",
+            snapshot_dir=snapshot_dir if os.path.exists(snapshot_dir) else None,
+            local_index_path=os.path.join(cache_dir, "index"),
+            index_quantization=index_quantization,
+            offline=True,
+            llm_mode=llm_mode
+        )
+    raise ValueError(f"Unknown evaluation mode: {mode}")
+
+def rank_queries(search_system, queries, limit, concurrency=4):
+    def run(query_data):
+        try:
+            search_results = search_system.search(query_data["query"], limit=limit)
+            return [result["name"] for result in search_results]
+        except Exception as e:
+            print(f"\nError processing query: {query_data['query'][:100]}...: {str(e)}")
+            return None
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        return list(executor.map(run, queries))
+
+def evaluate_search_system(test_queries, k_values=[5, 10], search_system=None, concurrency=4):
+    if search_system is None:
+        search_system = AssessmentSearchSystem(mongodb_uri)
+
+    queries = test_queries["queries"]
+    query_count = len(queries)
+    # One ranking at the largest k serves every smaller k.
+    rankings = rank_queries(search_system, queries, max(k_values), concurrency)
+
     results = {}
-    
     for k in k_values:
         total_recall = 0
         total_map = 0
-        query_count = len(test_queries["queries"])
         
         print(f"\nEvaluating for k={k}:")
         print("-" * 50)
         
-        for i, query_data in enumerate(test_queries["queries"], 1):
-            try:
-                query = query_data["query"]
-                actual_assessments = query_data["assessments"]
-        
-                search_system = AssessmentSearchSystem(mongodb_uri)
-                search_results = search_system.search(query, limit=k)
-                predicted_assessments = [result["name"] for result in search_results]
-                
-                recall, _ = calculate_metrics(actual_assessments, predicted_assessments, k)
-                ap = calculate_ap(actual_assessments, predicted_assessments, k)
-                
-                total_recall += recall
-                total_map += ap
-                
-                print(f"\nQuery {i}:")
-                print(f"Query: {query[:100]}...")
-                print(f"Recall@{k}: {recall:.3f}")
-                print(f"AP@{k}: {ap:.3f}")
-                print(f"Expected: {actual_assessments}")
-                print(f"Predicted: {predicted_assessments}")
-                
-                # Sleep to avoid rate limiting
-                time.sleep(20)
-                
-            except Exception as e:
-                print(f"\nError processing query {i}: {str(e)}")
+        for i, (query_data, predicted_assessments) in enumerate(zip(queries, rankings), 1):
+            if predicted_assessments is None:
                 continue
+            query = query_data["query"]
+            actual_assessments = query_data["assessments"]
+            
+            recall, _ = calculate_metrics(actual_assessments, predicted_assessments, k)
+            ap = calculate_ap(actual_assessments, predicted_assessments, k)
+            
+            total_recall += recall
+            total_map += ap
+            
+            print(f"\nQuery {i}:")
+            print(f"Query: {query[:100]}...")
+            print(f"Recall@{k}: {recall:.3f}")
+            print(f"AP@{k}: {ap:.3f}")
+            print(f"Expected: {actual_assessments}")
+            print(f"Predicted: {predicted_assessments[:k]}")
         
         mean_recall = total_recall / query_count
         mean_ap = total_map / query_count
@@ -91,13 +158,28 @@ def evaluate_search_system(test_queries, k_values=[5, 10]):
     return results
 
 def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--mode", choices=["live", "record", "replay"], default="live")
+    parser.add_argument("--cache-dir", default="eval_cache")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--llm-mode", choices=["always", "auto", "off"], default="auto")
+    parser.add_argument("--embedding-backend", choices=["torch", "onnx", "onnx-int8"], default="torch")
+    parser.add_argument("--quantization", choices=["float16", "int8"], help="quantize the local index in replay mode")
+    parser.add_argument("--test-file", default="shl_test.json")
+    parser.add_argument("--output", default="evaluation_results.json")
+    args = parser.parse_args()
+
     try:
-        with open("shl_test.json", "r") as f:
+        with open(args.test_file, "r") as f:
             test_queries = json.load(f)
+
+        search_system = build_search_system(
+            args.mode, args.cache_dir, args.concurrency, args.llm_mode,
+            args.embedding_backend, args.quantization
+        )
+        results = evaluate_search_system(test_queries, search_system=search_system, concurrency=args.concurrency)
         
-        results = evaluate_search_system(test_queries)
-        
-        with open("evaluation_results.json", "w") as f:
+        with open(args.output, "w") as f:
             json.dump(results, f, indent=2)
             
     except Exception as e:
@@ -0,0 +1,221 @@
+import json
+
+import numpy as np
+from bson.binary import Binary
+
+from catalog_snapshot import load_snapshot, write_snapshot
+
+DOCUMENT_FIELDS = [
+    "name",
+    "url",
+    "remote_testing",
+    "adaptive",
+    "test_type",
+    "description",
+    "job_levels",
+    "languages",
+    "assessment_length",
+]
+
+
+def to_number(value):
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        return np.nan
+    return number
+
+
+def split_list(value):
+    if isinstance(value, (list, tuple, np.ndarray)):
+        return [str(item).strip() for item in value if str(item).strip()]
+    if not isinstance(value, str):
+        return []
+    return [item.strip() for item in value.split(',') if item.strip()]
+
+
+QUANTIZATIONS = (None, "float16", "int8")
+
+# Rows are dequantized this many at a time so that scoring a quantized
+# matrix never materializes a full float32 copy.
+SCORE_BLOCK_ROWS = 4096
+
+
+def embedding_array(value):
+    # Embeddings are stored either as plain arrays or as BSON binary vectors.
+    if isinstance(value, Binary):
+        return np.asarray(value.as_vector().data, dtype=np.float32)
+    return np.asarray(value, dtype=np.float32)
+
+
+def quantize_rows(matrix, quantization):
+    if quantization == "float16":
+        return np.ascontiguousarray(matrix, dtype=np.float16), None
+    if quantization == "int8":
+        # Symmetric per-row scale; rows are unit length so values lie in [-1, 1].
+        scales = np.abs(matrix).max(axis=1)
+        scales[scales == 0] = 1.0
+        quantized = np.round(matrix / scales[:, None] * 127.0).astype(np.int8)
+        return quantized, (scales / 127.0).astype(np.float32)
+    raise ValueError(f"Unknown quantization: {quantization}")
+
+
+def normalize_rows(matrix):
+    matrix = np.asarray(matrix, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return np.ascontiguousarray(matrix / norms, dtype=np.float32)
+
+
+class CatalogFilter:
+    def __init__(self, documents):
+        self.documents = documents
+        self.lengths = np.array([to_number(doc.get("assessment_length")) for doc in documents], dtype=np.float32)
+        self.bitmaps = {}
+
+    def _bitmap(self, field):
+        # Inverted index from each value of a list field to a boolean mask
+        # over the documents, built on first use.
+        if field not in self.bitmaps:
+            bitmap = {}
+            for i, doc in enumerate(self.documents):
+                for value in split_list(doc.get(field)):
+                    if value not in bitmap:
+                        bitmap[value] = np.zeros(len(self.documents), dtype=bool)
+                    bitmap[value][i] = True
+            self.bitmaps[field] = bitmap
+        return self.bitmaps[field]
+
+    def mask(self, filters):
+        mask = np.ones(len(self.documents), dtype=bool)
+        if not filters:
+            return mask
+        for field, condition in filters.items():
+            if field == "assessment_length":
+                with np.errstate(invalid='ignore'):
+                    if "$lte" in condition:
+                        mask &= self.lengths <= condition["$lte"]
+                    if "$gte" in condition:
+                        mask &= self.lengths >= condition["$gte"]
+                    if "$eq" in condition:
+                        mask &= self.lengths == condition["$eq"]
+            else:
+                bitmap = self._bitmap(field)
+                field_mask = np.zeros(len(self.documents), dtype=bool)
+                for value in condition:
+                    if value in bitmap:
+                        field_mask |= bitmap[value]
+                mask &= field_mask
+        return mask
+
+
+def result_document(doc, score):
+    result = {key: value for key, value in doc.items() if key != "text"}
+    result["score"] = score
+    return result
+
+
+class LocalVectorIndex:
+    def __init__(self, embeddings, documents, normalized=False, quantization=None, rescore_multiplier=4,
+                 version=None):
+        if quantization not in QUANTIZATIONS:
+            raise ValueError(f"Unknown quantization: {quantization}")
+        self.matrix = embeddings if normalized else normalize_rows(embeddings)
+        self.documents = documents
+        # Catalog snapshot version the index was loaded from, if any.
+        self.version = version
+        self.catalog_filter = CatalogFilter(documents)
+        self.quantization = quantization
+        self.rescore_multiplier = rescore_multiplier
+        self.quantized = None
+        self.scales = None
+        if quantization:
+            self.quantized, self.scales = quantize_rows(self.matrix, quantization)
+            if not rescore_multiplier:
+                # Without rescoring only the quantized rows are kept.
+                self.matrix = None
+
+    @classmethod
+    def from_collection(cls, collection, **kwargs):
+        projection = {field: 1 for field in DOCUMENT_FIELDS}
+        projection.update({"_id": 0, "embedding": 1, "text": 1})
+        documents = []
+        embeddings = []
+        for doc in collection.find({"embedding": {"$exists": True}}, projection):
+            embeddings.append(embedding_array(doc.pop("embedding")))
+            documents.append(doc)
+        if not embeddings:
+            raise ValueError("No embedded documents found in collection")
+        return cls(np.array(embeddings, dtype=np.float32), documents, **kwargs)
+
+    def _dequantized(self):
+        matrix = self.quantized.astype(np.float32)
+        if self.scales is not None:
+            matrix *= self.scales[:, None]
+        return matrix
+
+    def save(self, path):
+        np.save(f"{path}.npy", self.matrix if self.matrix is not None else normalize_rows(self._dequantized()))
+        with open(f"{path}.json", "w") as f:
+            json.dump(self.documents, f)
+
+    @classmethod
+    def load(cls, path, mmap=True, **kwargs):
+        matrix = np.load(f"{path}.npy", mmap_mode='r' if mmap else None)
+        with open(f"{path}.json", "r") as f:
+            documents = json.load(f)
+        return cls(matrix, documents, normalized=True, **kwargs)
+
+    @classmethod
+    def from_snapshot(cls, root, version=None, verify=False, **kwargs):
+        matrix, documents, manifest = load_snapshot(root, version, verify=verify)
+        return cls(matrix, documents, normalized=True, version=manifest["version"], **kwargs)
+
+    def save_snapshot(self, root, model_name=""):
+        matrix = self.matrix if self.matrix is not None else normalize_rows(self._dequantized())
+        return write_snapshot(root, matrix, self.documents, model_name)
+
+    def _quantized_scores(self, query, rows):
+        scores = np.empty(len(rows), dtype=np.float32)
+        for start in range(0, len(rows), SCORE_BLOCK_ROWS):
+            block = rows[start:start + SCORE_BLOCK_ROWS]
+            scores[start:start + len(block)] = self.quantized[block].astype(np.float32) @ query
+        if self.scales is not None:
+            scores *= self.scales[rows]
+        return scores
+
+    def _top(self, scores, k):
+        top = np.argpartition(-scores, k - 1)[:k]
+        return top[np.argsort(-scores[top], kind='stable')]
+
+    def search(self, query_embedding, limit, filters=None):
+        query = np.asarray(query_embedding, dtype=np.float32)
+        norm = np.linalg.norm(query)
+        if norm > 0:
+            query = query / norm
+
+        candidates = np.flatnonzero(self.catalog_filter.mask(filters))
+        if len(candidates) == 0:
+            return []
+
+        k = min(limit, len(candidates))
+        if self.quantized is None:
+            unfiltered = len(candidates) == len(self.documents)
+            candidate_scores = (self.matrix if unfiltered else self.matrix[candidates]) @ query
+        else:
+            # Shortlist on the quantized rows, then rescore the shortlist
+            # against the full-precision (usually memory-mapped) matrix.
+            candidate_scores = self._quantized_scores(query, candidates)
+            if self.matrix is not None:
+                shortlist = self._top(candidate_scores, min(k * self.rescore_multiplier, len(candidates)))
+                candidates = candidates[shortlist]
+                candidate_scores = self.matrix[candidates] @ query
+
+        # Same scale as Atlas vectorSearchScore for cosine similarity.
+        candidate_scores = (1.0 + candidate_scores) / 2.0
+        top = self._top(candidate_scores, k)
+
+        results = []
+        for i in top:
+            results.append(result_document(self.documents[candidates[i]], float(candidate_scores[i])))
+        return results
@@ -0,0 +1,107 @@
+import threading
+import time
+from contextlib import contextmanager
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def format_labels(labels):
+    if not labels:
+        return ""
+    parts = []
+    for key, value in labels:
+        value = str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+        parts.append(f'{key}="{value}"')
+    return "{" + ",".join(parts) + "}"
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Metrics:
+    def __init__(self, prefix="shl_", buckets=DEFAULT_BUCKETS):
+        self.prefix = prefix
+        self.buckets = buckets
+        self.lock = threading.Lock()
+        self.counters = {}
+        self.histograms = {}
+        self.callbacks = {}
+        self.help = {}
+
+    def inc(self, name, value=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name, value, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            if key not in self.histograms:
+                self.histograms[key] = Histogram(self.buckets)
+            self.histograms[key].observe(value)
+
+    def register_callback(self, name, metric_type, help_text, fn):
+        self.callbacks[name] = (metric_type, fn)
+        self.help[name] = help_text
+
+    @contextmanager
+    def span(self, stage):
+        started = time.perf_counter()
+        try:
+            yield
+        except BaseException:
+            self.inc("errors_total", stage=stage)
+            raise
+        finally:
+            self.observe("stage_duration_seconds", time.perf_counter() - started, stage=stage)
+
+    def _group(self, items):
+        grouped = {}
+        for (name, labels), value in items:
+            grouped.setdefault(name, []).append((labels, value))
+        return grouped
+
+    def render(self):
+        lines = []
+        with self.lock:
+            counters = self._group(self.counters.items())
+            histograms = self._group(
+                (key, (list(h.counts), h.sum, h.count)) for key, h in self.histograms.items()
+            )
+
+        for name, series in sorted(counters.items()):
+            full_name = self.prefix + name
+            lines.append(f"# TYPE {full_name} counter")
+            for labels, value in series:
+                lines.append(f"{full_name}{format_labels(labels)} {value}")
+
+        for name, series in sorted(histograms.items()):
+            full_name = self.prefix + name
+            lines.append(f"# TYPE {full_name} histogram")
+            for labels, (counts, total, count) in series:
+                for bound, bucket_count in zip(self.buckets, counts):
+                    bucket_labels = labels + (("le", bound),)
+                    lines.append(f"{full_name}_bucket{format_labels(bucket_labels)} {bucket_count}")
+                lines.append(f"{full_name}_bucket{format_labels(labels + (('le', '+Inf'),))} {count}")
+                lines.append(f"{full_name}_sum{format_labels(labels)} {total}")
+                lines.append(f"{full_name}_count{format_labels(labels)} {count}")
+
+        for name, (metric_type, fn) in sorted(self.callbacks.items()):
+            full_name = self.prefix + name
+            lines.append(f"# HELP {full_name} {self.help[name]}")
+            lines.append(f"# TYPE {full_name} {metric_type}")
+            lines.append(f"{full_name} {fn()}")
+
+        return "\n".join(lines) + "\n"
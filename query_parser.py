@@ -0,0 +1,226 @@
+import re
+
+from local_index import split_list
+
+TEST_TYPES = [
+    'Ability & Aptitude',
+    'Biodata & Situational Judgement',
+    'Competencies',
+    'Development & 360',
+    'Assessment Exercises',
+    'Knowledge & Skills',
+    'Personality & Behavior',
+    'Simulations'
+]
+
+# Only phrases that name a kind of test: inferred types become a hard
+# prefilter, so generic words ("ability", "behavior", "360") must not match.
+TEST_TYPE_KEYWORDS = {
+    'Ability & Aptitude': ['aptitude test', 'aptitude assessment', 'ability test', 'cognitive test',
+                           'cognitive ability', 'cognitive assessment', 'reasoning test',
+                           'numerical reasoning', 'verbal reasoning', 'inductive reasoning',
+                           'deductive reasoning', 'logical reasoning'],
+    'Biodata & Situational Judgement': ['biodata', 'situational judgement', 'situational judgment', 'sjt'],
+    'Competencies': ['competency test', 'competency assessment', 'competency-based assessment'],
+    'Development & 360': ['360 feedback', '360-degree', '360 degree'],
+    'Assessment Exercises': ['assessment exercise', 'in-tray', 'in tray exercise', 'role play exercise',
+                             'role-play exercise', 'group exercise', 'case study exercise'],
+    'Knowledge & Skills': ['knowledge test', 'skills test', 'technical test', 'coding test', 'technical assessment'],
+    'Personality & Behavior': ['personality test', 'personality assessment', 'personality questionnaire',
+                               'behavioral assessment', 'behavioural assessment', 'opq',
+                               'motivation questionnaire'],
+    'Simulations': ['simulation test', 'simulation assessment', 'simulation exercise', 'job simulation'],
+}
+
+DEFAULT_LANGUAGES = ['English', 'Spanish', 'French', 'German', 'Italian', 'Portuguese', 'Dutch', 'Chinese',
+                     'Japanese', 'Korean', 'Arabic', 'Russian', 'Turkish', 'Polish', 'Swedish', 'Danish',
+                     'Norwegian', 'Finnish', 'Greek', 'Czech', 'Hungarian', 'Romanian', 'Indonesian', 'Thai',
+                     'Vietnamese', 'Malay', 'Hindi']
+
+DEFAULT_JOB_LEVELS = ['Entry-Level', 'Graduate', 'Mid-Professional', 'Professional Individual Contributor',
+                      'Front Line Manager', 'Supervisor', 'Manager', 'Director', 'Executive', 'General Population']
+
+JOB_LEVEL_KEYWORDS = {
+    'Entry-Level': ['entry level', 'entry-level', 'junior', 'fresher', 'intern'],
+    'Graduate': ['graduate', 'new grad', 'campus'],
+    'Mid-Professional': ['mid-level', 'mid level', 'mid-professional', 'mid professional'],
+    'Manager': ['manager', 'management'],
+    'Director': ['director'],
+    'Executive': ['executive', 'c-level', 'cxo', 'vp'],
+    'Supervisor': ['supervisor', 'team lead'],
+}
+
+WORD_NUMBERS = {'an': 1, 'a': 1, 'one': 1, 'two': 2, 'three': 3, 'half an': 0.5}
+
+MINUTES = r'(?:minutes?|mins?)\b'
+HOURS = r'(?:hours?|hrs?)\b'
+
+AT_LEAST = r'(?:at least|more than|over|minimum of|min\.?)'
+
+# "90 minutes", "an hour", "1 hour 30 minutes", "1.5 hrs", optionally
+# preceded by an at-least qualifier.
+DURATION = re.compile(
+    rf'(?P<at_least>{AT_LEAST}\s*)?'
+    rf'(?:\b(?P<hours>half an|an|a|one|two|three|\d+(?:\.\d+)?)\s*{HOURS}'
+    rf'(?:\s*(?:and\s*)?(?P<extra_minutes>\d+)\s*{MINUTES})?'
+    rf'|(?P<minutes>\d+(?:\.\d+)?)\s*{MINUTES})'
+)
+
+RANGE_JOIN = r'(?:-|to|and)'
+
+EXPLICIT_LENGTH = re.compile(r'Assessment Length:\s*((?:<=|>=|)\d+(?:-\d+)?)', re.I)
+
+VAGUE_LENGTH = re.compile(r'\b(?:quick|short|brief|lengthy|long)\b(?:\s+\w+)?\s+(?:test|assessment)', re.I)
+
+LENGTH_PHRASE = re.compile(
+    rf'(?:under|within|about|around|less than|at most|at least|more than|max(?:imum)?(?: of)?)?\s*'
+    rf'(?:half an|an|a|one|two|three|\d+(?:\.\d+)?(?:\s*(?:-|to)\s*\d+)?)\s*(?:{MINUTES}|{HOURS})',
+    re.I
+)
+
+SKILL_SPLIT = re.compile(r',|;|/|\band\b|\bor\b|\bwith\b|\bplus\b|\bincluding\b', re.I)
+
+SKILL_STOPWORDS = {'a', 'an', 'the', 'who', 'is', 'are', 'can', 'in', 'of', 'for', 'to', 'be', 'also',
+                   'good', 'strong', 'skills', 'skill', 'knowledge', 'experience', 'experienced',
+                   'looking', 'hiring', 'need', 'want', 'i', 'we', 'am', 'someone', 'candidates',
+                   'proficient', 'test', 'tests', 'assessment', 'assessments', 'role', 'job',
+                   'should', 'must', 'able', 'which', 'that', 'has', 'have', 'also', 'who', 'my', 'our'}
+
+
+def has_keyword(text, keyword):
+    # Whole words only, with an optional plural: "intern" matches "interns"
+    # but not "international" or "internal".
+    return re.search(rf'\b{re.escape(keyword)}s?\b', text) is not None
+
+
+class QueryParser:
+    def __init__(self, languages=None, job_levels=None, max_local_words=25):
+        self.max_local_words = max_local_words
+        self.languages = self._language_lexicon(languages or DEFAULT_LANGUAGES)
+        self.job_levels = self._job_level_lexicon(job_levels or DEFAULT_JOB_LEVELS)
+
+    @classmethod
+    def from_documents(cls, documents, **kwargs):
+        languages = sorted({value for doc in documents for value in split_list(doc.get('languages'))})
+        job_levels = sorted({value for doc in documents for value in split_list(doc.get('job_levels'))})
+        return cls(languages=languages or None, job_levels=job_levels or None, **kwargs)
+
+    @classmethod
+    def from_collection(cls, collection, **kwargs):
+        # Sorted like from_documents so both build the same lexicon for a catalog.
+        languages = sorted(value for value in collection.distinct('languages') if isinstance(value, str))
+        job_levels = sorted(value for value in collection.distinct('job_levels') if isinstance(value, str))
+        return cls(languages=languages or None, job_levels=job_levels or None, **kwargs)
+
+    def _language_lexicon(self, languages):
+        # "English (USA)" and "English International" are both found by "english".
+        lexicon = {}
+        for language in languages:
+            base = language.split('(')[0].strip().split(' ')[0].casefold()
+            if base:
+                lexicon.setdefault(base, []).append(language)
+        return lexicon
+
+    def _job_level_lexicon(self, job_levels):
+        lexicon = {}
+        for level in job_levels:
+            keywords = JOB_LEVEL_KEYWORDS.get(level, []) + [level.casefold()]
+            for keyword in keywords:
+                lexicon.setdefault(keyword, []).append(level)
+        return lexicon
+
+    def _duration_minutes(self, match):
+        if match.group('minutes'):
+            return float(match.group('minutes'))
+        hours = WORD_NUMBERS.get(match.group('hours'))
+        if hours is None:
+            hours = float(match.group('hours'))
+        return hours * 60 + float(match.group('extra_minutes') or 0)
+
+    def _parse_length(self, query):
+        # Returns (length, ambiguous). Several durations that do not form a
+        # range ("a 20 minute test and a 1 hour interview") are left to the LLM.
+        match = EXPLICIT_LENGTH.search(query)
+        if match:
+            return match.group(1), False
+
+        text = query.casefold()
+        number = r'(\d+(?:\.\d+)?)'
+
+        match = re.search(rf'{number}\s*{RANGE_JOIN}\s*{number}\s*{MINUTES}', text)
+        if match:
+            return f"{int(float(match.group(1)))}-{int(float(match.group(2)))}", False
+
+        match = re.search(rf'{number}\s*{RANGE_JOIN}\s*{number}\s*{HOURS}', text)
+        if match:
+            return f"{int(float(match.group(1)) * 60)}-{int(float(match.group(2)) * 60)}", False
+
+        durations = list(DURATION.finditer(text))
+        if not durations:
+            return None, False
+        if len(durations) == 2 and re.fullmatch(rf'\s*{RANGE_JOIN}\s*', text[durations[0].end():durations[1].start()]):
+            # Mixed units: "30 minutes to an hour", "1 hour - 90 minutes".
+            low, high = sorted(self._duration_minutes(match) for match in durations)
+            return f"{int(low)}-{int(high)}", False
+        match = durations[0]
+        operator = ">=" if match.group('at_least') else "<="
+        return f"{operator}{int(self._duration_minutes(match))}", len(durations) > 1
+
+    def parse_length(self, query):
+        return self._parse_length(query)[0]
+
+    def parse(self, query):
+        text = f" {query.casefold()} "
+        # Full names only count when they cannot be ordinary words
+        # ("Competencies", "Simulations").
+        test_types = [
+            test_type for test_type in TEST_TYPES
+            if ('&' in test_type and test_type.casefold() in text)
+            or any(has_keyword(text, keyword) for keyword in TEST_TYPE_KEYWORDS[test_type])
+        ]
+        languages = []
+        for base, values in self.languages.items():
+            if re.search(rf'\b{re.escape(base)}\b', text):
+                languages.extend(value for value in values if value not in languages)
+        job_levels = []
+        for keyword, levels in self.job_levels.items():
+            if has_keyword(text, keyword):
+                job_levels.extend(level for level in levels if level not in job_levels)
+
+        assessment_length, length_ambiguous = self._parse_length(query)
+        ambiguous = (len(query.split()) > self.max_local_words or bool(VAGUE_LENGTH.search(query))
+                     or length_ambiguous)
+        return {
+            'assessment_length': assessment_length,
+            'test_types': test_types,
+            'languages': languages,
+            'job_levels': job_levels,
+            'ambiguous': ambiguous
+        }
+
+    def to_refined(self, query, parsed):
+        description = re.sub(r'\s+', ' ', EXPLICIT_LENGTH.sub(' ', query)).strip()
+        lines = [f"Description: {description}"]
+        if parsed['test_types']:
+            lines.append(f"Test Type: {', '.join(parsed['test_types'])}")
+        if parsed['job_levels']:
+            lines.append(f"Job Levels: {', '.join(parsed['job_levels'])}")
+        if parsed['languages']:
+            lines.append(f"Languages: {', '.join(parsed['languages'])}")
+        if parsed['assessment_length']:
+            lines.append(f"Assessment Length: {parsed['assessment_length']}")
+        return "\n".join(lines)
+
+    def extract_skills(self, query, max_skills=7):
+        text = LENGTH_PHRASE.sub(' ', EXPLICIT_LENGTH.sub(' ', query))
+        skills = []
+        for chunk in SKILL_SPLIT.split(text):
+            words = [word for word in re.findall(r'[\w.#+-]+', chunk) if word.casefold() not in SKILL_STOPWORDS]
+            if not words or len(words) > 4:
+                continue
+            skill = ' '.join(words)
+            if skill.casefold() not in [s.casefold() for s in skills]:
+                skills.append(skill)
+            if len(skills) == max_skills:
+                break
+        return skills or [re.sub(r'\s+', ' ', query).strip()]
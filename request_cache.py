@@ -0,0 +1,55 @@
+import asyncio
+
+from llm_cache import LRUCache, normalize_prompt
+
+
+def normalize_query(query):
+    return normalize_prompt(query)
+
+
+class SingleFlight:
+    def __init__(self):
+        self.calls = {}
+
+    def _finished(self, key, task):
+        if self.calls.get(key) is task:
+            del self.calls[key]
+        # Retrieve the exception so it is not reported as unhandled when
+        # every waiter has gone away.
+        if not task.cancelled():
+            task.exception()
+
+    async def do(self, key, fn):
+        # Concurrent callers with the same key share one call of fn(). Returns
+        # (result, shared); the computation keeps running if a caller is
+        # cancelled so the others still get the result.
+        task = self.calls.get(key)
+        shared = task is not None
+        if not shared:
+            task = asyncio.ensure_future(fn())
+            self.calls[key] = task
+            task.add_done_callback(lambda task: self._finished(key, task))
+        return await asyncio.shield(task), shared
+
+
+class ResponseCache:
+    def __init__(self, max_entries=1024, ttl=600):
+        self.entries = LRUCache(max_entries=max_entries, ttl=ttl)
+
+    def key(self, query, catalog_version):
+        return (normalize_query(query), catalog_version)
+
+    def get(self, key):
+        return self.entries.get(key)
+
+    def set(self, key, value):
+        self.entries.set(key, value)
+
+    def stats(self):
+        total = self.entries.hits + self.entries.misses
+        return {
+            "hits": self.entries.hits,
+            "misses": self.entries.misses,
+            "hit_rate": self.entries.hits / total if total else 0.0,
+            "entries": len(self.entries)
+        }
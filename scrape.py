@@ -1,14 +1,151 @@
-from playwright.sync_api import sync_playwright
+from playwright.async_api import async_playwright
 import pandas as pd
-import time
+import lxml.html
+import asyncio
+import hashlib
+import json
+import os
 import re
+import sqlite3
+import time
+from urllib.parse import urljoin, urlparse
+from rate_limit import TokenBucket
+
+BASE_URL = "https://www.shl.com"
+
+class ScrapeState:
+    def __init__(self, path):
+        self.conn = sqlite3.connect(path)
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS urls (url TEXT PRIMARY KEY, status TEXT, attempts INTEGER, error TEXT, updated REAL)"
+        )
+        self.conn.commit()
+
+    def add(self, urls):
+        self.conn.executemany(
+            "INSERT OR IGNORE INTO urls (url, status, attempts, error, updated) VALUES (?, 'pending', 0, NULL, ?)",
+            [(url, time.time()) for url in urls]
+        )
+        self.conn.commit()
+
+    def pending(self, max_attempts):
+        rows = self.conn.execute(
+            "SELECT url FROM urls WHERE status != 'done' AND attempts < ? ORDER BY rowid", (max_attempts,)
+        ).fetchall()
+        return [row[0] for row in rows]
+
+    def mark_done(self, url):
+        self.conn.execute(
+            "UPDATE urls SET status = 'done', attempts = attempts + 1, error = NULL, updated = ? WHERE url = ?",
+            (time.time(), url)
+        )
+        self.conn.commit()
+
+    def mark_failed(self, url, error):
+        self.conn.execute(
+            "UPDATE urls SET status = 'failed', attempts = attempts + 1, error = ?, updated = ? WHERE url = ?",
+            (error, time.time(), url)
+        )
+        self.conn.commit()
+
+    def close(self):
+        self.conn.close()
+
+class RecordWriter:
+    def __init__(self, path):
+        self.file = open(path, "a+", encoding="utf-8")
+        if self.file.tell() > 0:
+            self.file.seek(self.file.tell() - 1)
+            if self.file.read(1) != "\n":
+                # Terminate a record truncated by an interrupted run.
+                self.file.write("\n")
+
+    def append(self, record):
+        self.file.write(json.dumps(record) + "\n")
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+def read_records(path, key):
+    records = {}
+    if not os.path.exists(path):
+        return []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                # A run interrupted mid-write can leave a truncated last line.
+                continue
+            records[record[key]] = record
+    return list(records.values())
+
+class HostRateLimiter:
+    def __init__(self, requests_per_second):
+        self.requests_per_second = requests_per_second
+        self.buckets = {}
 
-def initialize_browser():
-    playwright = sync_playwright().start()
-    browser = playwright.chromium.launch(headless=False)
-    context = browser.new_context()
-    page = context.new_page()
-    return playwright, browser, page
+    async def wait(self, url):
+        host = urlparse(url).netloc
+        if host not in self.buckets:
+            self.buckets[host] = TokenBucket(self.requests_per_second, 1)
+        await self.buckets[host].acquire_async()
+
+async def run_scrape_pool(urls, handler, state_path, output_path, concurrency=4,
+                          requests_per_second=1.0, max_attempts=3, headless=True, browser=None):
+    # A browser may be passed in (and stays owned by the caller); otherwise a
+    # headless Chromium is launched for the run.
+    state = ScrapeState(state_path)
+    state.add(urls)
+    pending = state.pending(max_attempts)
+    print(f"{len(pending)} of {len(urls)} URLs left to scrape")
+
+    writer = RecordWriter(output_path)
+    limiter = HostRateLimiter(requests_per_second)
+    queue = asyncio.Queue()
+    for url in pending:
+        queue.put_nowait(url)
+
+    async def worker(browser):
+        context = await browser.new_context()
+        page = await context.new_page()
+        try:
+            while True:
+                try:
+                    url = queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    return
+                await limiter.wait(url)
+                try:
+                    for record in await handler(page, url):
+                        writer.append(record)
+                    state.mark_done(url)
+                except Exception as e:
+                    print(f"Error processing {url}: {str(e)}")
+                    state.mark_failed(url, str(e))
+        finally:
+            await context.close()
+
+    async def run_workers(browser):
+        await asyncio.gather(*[worker(browser) for _ in range(concurrency)])
+
+    try:
+        if browser is not None:
+            await run_workers(browser)
+        else:
+            async with async_playwright() as playwright:
+                browser = await playwright.chromium.launch(headless=headless)
+                try:
+                    await run_workers(browser)
+                finally:
+                    await browser.close()
+    finally:
+        writer.close()
+        state.close()
 
 def get_test_type_full_form(letter):
     test_type_map = {
@@ -23,138 +160,156 @@ def get_test_type_full_form(letter):
     }
     return test_type_map.get(letter.upper(), letter)
 
-def scrape_product_details(page, url):
-    print(f"Visiting product page: {url}")
-    page.goto(url)
-    
-    page.wait_for_selector('.product-catalogue-training-calendar__row', timeout=10000)
-    
+DETAIL_FIELDS = {
+    'Description': 'Description',
+    'Job levels': 'Job Levels',
+    'Languages': 'Languages',
+    'Assessment length': 'Assessment Length',
+}
+
+def parse_product_details(html):
+    tree = lxml.html.fromstring(html)
+    rows = tree.xpath(
+        "//*[contains(concat(' ', normalize-space(@class), ' '), ' product-catalogue-training-calendar__row ')]"
+    )
+
     details = {}
-    
-    try:
-        description_div = page.query_selector('.product-catalogue-training-calendar__row:has(h4:text-is("Description"))')
-        if description_div:
-            description = description_div.query_selector('p').inner_text().strip()
-            details['Description'] = description
-    except:
-        details['Description'] = "Not available"
-    
-    try:
-        job_levels_div = page.query_selector('.product-catalogue-training-calendar__row:has(h4:text-is("Job levels"))')
-        if job_levels_div:
-            job_levels = job_levels_div.query_selector('p').inner_text().strip()
-            details['Job Levels'] = job_levels
-    except:
-        details['Job Levels'] = "Not available"
-    
-    try:
-        languages_div = page.query_selector('.product-catalogue-training-calendar__row:has(h4:text-is("Languages"))')
-        if languages_div:
-            languages = languages_div.query_selector('p').inner_text().strip()
-            details['Languages'] = languages
-    except:
-        details['Languages'] = "Not available"
-    
-    try:
-        assessment_div = page.query_selector('.product-catalogue-training-calendar__row:has(h4:text-is("Assessment length"))')
-        if assessment_div:
-            assessment_text = assessment_div.query_selector('p').inner_text().strip()
+    for row in rows:
+        headings = row.xpath('.//h4')
+        paragraphs = row.xpath('.//p')
+        if not headings:
+            continue
+        field = DETAIL_FIELDS.get(headings[0].text_content().strip())
+        if field is None or field in details:
+            continue
+        if not paragraphs:
+            details[field] = "Not available"
+            continue
+
+        text = paragraphs[0].text_content().strip()
+        if field == 'Assessment Length':
             # Extract number using regex
-            match = re.search(r'(\d+)', assessment_text)
-            if match:
-                details['Assessment Length'] = match.group(1)
-            else:
-                details['Assessment Length'] = assessment_text
-    except:
-        details['Assessment Length'] = "Not available"
-    
+            match = re.search(r'(\d+)', text)
+            text = match.group(1) if match else text
+        details[field] = text
     return details
 
-def scrape_shl_product_catalog():
-    playwright, browser, page = initialize_browser()
-    all_results = []
+def save_snapshot(snapshot_dir, url, html):
+    os.makedirs(snapshot_dir, exist_ok=True)
+    file_name = f"{hashlib.sha256(url.encode('utf-8')).hexdigest()}.html"
+    with open(os.path.join(snapshot_dir, file_name), "w", encoding="utf-8") as f:
+        f.write(html)
+    writer = RecordWriter(os.path.join(snapshot_dir, "index.jsonl"))
+    writer.append({'URL': url, 'file': file_name})
+    writer.close()
 
-    for start in range(0, 133, 12):
-        url = f"https://www.shl.com/products/product-catalog/?start={start}&type=2"
-        print(f"Scraping page with start={start}...")
+def reparse_snapshots(snapshot_dir="html_snapshots", details_path="shl_product_details.jsonl"):
+    writer = RecordWriter(details_path)
+    count = 0
+    try:
+        for record in read_records(os.path.join(snapshot_dir, "index.jsonl"), 'URL'):
+            with open(os.path.join(snapshot_dir, record['file']), "r", encoding="utf-8") as f:
+                details = parse_product_details(f.read())
+            details['URL'] = record['URL']
+            writer.append(details)
+            count += 1
+    finally:
+        writer.close()
+    print(f"Re-parsed {count} snapshots into {details_path}")
+
+async def scrape_product_details(page, url, snapshot_dir="html_snapshots"):
+    print(f"Visiting product page: {url}")
+    await page.goto(url)
+    
+    await page.wait_for_selector('.product-catalogue-training-calendar__row', timeout=10000)
+    html = await page.content()
+    if snapshot_dir:
+        save_snapshot(snapshot_dir, url, html)
+    return parse_product_details(html)
+
+async def scrape_catalog_page(page, url, base_url=BASE_URL):
+    print(f"Scraping catalog page {url}...")
+    await page.goto(url)
+    await page.wait_for_selector('table', timeout=10000)
+    
+    rows = await page.query_selector_all('table > tbody > tr:not(:first-child)')
+    
+    results = []
+    for row in rows:
+        name_cell = await row.query_selector('td.custom__table-heading__title a')
+        if name_cell:
+            name = (await name_cell.inner_text()).strip()
+            product_url = await name_cell.get_attribute('href')
+            if product_url and not product_url.startswith('http'):
+                product_url = urljoin(base_url, product_url)
+        else:
+            continue 
         
-        page.goto(url)
-        page.wait_for_selector('table', timeout=10000)
+        remote_circle = await row.query_selector('td:nth-child(2) span.catalogue__circle')
+        remote_testing = 'Yes' if remote_circle and '-yes' in await remote_circle.get_attribute('class') else 'No'
         
-        rows = page.query_selector_all('table > tbody > tr:not(:first-child)')
+        adaptive_circle = await row.query_selector('td:nth-child(3) span.catalogue__circle')
+        adaptive = 'Yes' if adaptive_circle and '-yes' in await adaptive_circle.get_attribute('class') else 'No'
         
-        results = []
-        for row in rows:
-            name_cell = row.query_selector('td.custom__table-heading__title a')
-            if name_cell:
-                name = name_cell.inner_text().strip()
-                url = name_cell.get_attribute('href')
-                if url and not url.startswith('http'):
-                    url = f"https://www.shl.com{url}"
-            else:
-                continue 
-            
-            remote_circle = row.query_selector('td:nth-child(2) span.catalogue__circle')
-            remote_testing = 'Yes' if remote_circle and '-yes' in remote_circle.get_attribute('class') else 'No'
-            
-            adaptive_circle = row.query_selector('td:nth-child(3) span.catalogue__circle')
-            adaptive = 'Yes' if adaptive_circle and '-yes' in adaptive_circle.get_attribute('class') else 'No'
-            
-            test_type_letters = []
-            test_type_spans = row.query_selector_all('td:nth-child(4) span.product-catalogue__key')
-            for span in test_type_spans:
-                letter = span.inner_text().strip()
-                full_form = get_test_type_full_form(letter)
-                test_type_letters.append(full_form)
-            
-            product_data ={
-                'Name': name,
-                'URL': url,
-                'Remote Testing': remote_testing,
-                'Adaptive/IRT': adaptive,
-                'Test Type': ', '.join(test_type_letters)
-            }
-            results.append(product_data)
-            print(f"Completed extracting data for: {name}")
+        test_type_letters = []
+        test_type_spans = await row.query_selector_all('td:nth-child(4) span.product-catalogue__key')
+        for span in test_type_spans:
+            letter = (await span.inner_text()).strip()
+            full_form = get_test_type_full_form(letter)
+            test_type_letters.append(full_form)
         
-        all_results.extend(results)
-        time.sleep(2)
+        product_data ={
+            'Name': name,
+            'URL': product_url,
+            'Remote Testing': remote_testing,
+            'Adaptive/IRT': adaptive,
+            'Test Type': ', '.join(test_type_letters),
+            'Catalog Page': url
+        }
+        results.append(product_data)
+        print(f"Completed extracting data for: {name}")
+    return results
 
-    browser.close()
-    playwright.stop()
-    
-    return all_results
+def scrape_shl_product_catalog(base_url=BASE_URL, concurrency=4, requests_per_second=1.0,
+                               output_path="shl_product_catalog.jsonl", state_path="scrape_catalog_state.db"):
+    urls = [
+        f"{base_url}/products/product-catalog/?start={start}&type=2"
+        for start in range(0, 133, 12)
+    ]
+
+    async def handler(page, url):
+        return await scrape_catalog_page(page, url, base_url)
+
+    asyncio.run(run_scrape_pool(urls, handler, state_path, output_path, concurrency, requests_per_second))
+
+    # Keep the catalog in listing order regardless of which worker finished first.
+    page_order = {url: i for i, url in enumerate(urls)}
+    records = read_records(output_path, 'URL')
+    records.sort(key=lambda record: page_order.get(record.get('Catalog Page'), len(urls)))
+    return [{k: v for k, v in record.items() if k != 'Catalog Page'} for record in records]
 
-def enrich_product_catalog():
+def enrich_product_catalog(catalog_path="shl_product_catalog.csv", output_path="shl_product_catalog_enriched2.csv",
+                           details_path="shl_product_details.jsonl", state_path="scrape_details_state.db",
+                           snapshot_dir="html_snapshots", concurrency=4, requests_per_second=1.0):
     print("Loading existing product catalog...")
-    df = pd.read_csv("shl_product_catalog.csv")
-    
-    playwright, browser, page = initialize_browser()
-    
-    try:
-        for index, row in df.iterrows():
-            url = row['URL']
-            print(f"Processing {index + 1}/{len(df)}: {row['Name']}")
-            
-            try:
-                details = scrape_product_details(page, url)
-                for key, value in details.items():
-                    df.at[index, key] = value
-            except Exception as e:
-                print(f"Error processing {url}: {str(e)}")
-            
-            if (index + 1) % 10 == 0:
-                df.to_csv("shl_product_catalog_enriched.csv", index=False)
-                print(f"Progress saved - {index + 1} items processed")
-            
-            time.sleep(1)
-    
-    finally:
-        browser.close()
-        playwright.stop()
-    
-    df.to_csv("shl_product_catalog_enriched2.csv", index=False)
-    print("\nEnrichment complete! Saved to shl_product_catalog_enriched2.csv")
+    df = pd.read_csv(catalog_path)
+
+    async def handler(page, url):
+        details = await scrape_product_details(page, url, snapshot_dir)
+        details['URL'] = url
+        return [details]
+
+    asyncio.run(run_scrape_pool(df['URL'].dropna().tolist(), handler, state_path, details_path,
+                                concurrency, requests_per_second))
+
+    details = {record['URL']: record for record in read_records(details_path, 'URL')}
+    for index, row in df.iterrows():
+        for key, value in details.get(row['URL'], {}).items():
+            if key != 'URL':
+                df.at[index, key] = value
+
+    df.to_csv(output_path, index=False)
+    print(f"\nEnrichment complete! Saved to {output_path}")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,122 @@
+import argparse
+import gc
+import os
+import signal
+import socket
+import time
+import traceback
+
+# A worker that dies sooner than this after starting is restarted with an
+# exponential backoff, capped at MAX_RESTART_DELAY seconds.
+MIN_WORKER_UPTIME = 10.0
+MAX_RESTART_DELAY = 30.0
+
+# Set before tokenizers is imported; its thread pool does not survive fork.
+os.environ.setdefault("TOKENIZERS_PARALLELISM", "false")
+
+import uvicorn
+
+import shl_backend
+
+
+def bind_socket(host, port, backlog=2048):
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(backlog)
+    sock.set_inheritable(True)
+    return sock
+
+
+def run_worker(sock, workers, log_level):
+    shl_backend.app.state.search_system.after_fork(workers)
+    config = uvicorn.Config(shl_backend.app, log_level=log_level, lifespan="on")
+    uvicorn.Server(config).run(sockets=[sock])
+
+
+def spawn_worker(sock, workers, log_level):
+    pid = os.fork()
+    if pid == 0:
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        signal.signal(signal.SIGINT, signal.SIG_DFL)
+        code = 0
+        try:
+            run_worker(sock, workers, log_level)
+        except BaseException:
+            traceback.print_exc()
+            code = 1
+        finally:
+            os._exit(code)
+    return pid
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Serve shl_backend from pre-forked workers that share the model and catalog pages."
+    )
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--log-level", default="info")
+    args = parser.parse_args()
+    if shl_backend.index_backend == "local" and not (shl_backend.catalog_snapshot_dir or shl_backend.local_index_path):
+        # Loading the index from Mongo here would open a connection in the
+        # parent, and pymongo clients are not fork-safe.
+        parser.error("INDEX_BACKEND=local needs CATALOG_SNAPSHOT_DIR or LOCAL_INDEX_PATH when pre-forking")
+
+    # Load the model and the memory-mapped index (INDEX_BACKEND=local with
+    # CATALOG_SNAPSHOT_DIR or LOCAL_INDEX_PATH) once; workers inherit them
+    # copy-on-write. Each worker connects to Mongo and warms the model itself
+    # in the app lifespan.
+    search_system = shl_backend.create_search_system()
+    search_system.preload()
+    shl_backend.app.state.search_system = search_system
+
+    # Objects alive now are never collected, so keep the collector from
+    # writing to their headers and un-sharing the pages in every worker.
+    gc.collect()
+    gc.freeze()
+
+    sock = bind_socket(args.host, args.port)
+    workers = {}
+    for _ in range(args.workers):
+        workers[spawn_worker(sock, args.workers, args.log_level)] = time.monotonic()
+    print(f"Serving on {args.host}:{args.port} with {len(workers)} workers")
+
+    stopping = False
+    restart_delay = 0.0
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in list(workers):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    while workers:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        started = workers.pop(pid, None)
+        if stopping:
+            continue
+        if started is not None and time.monotonic() - started < MIN_WORKER_UPTIME:
+            # Crashing on startup; do not restart it in a tight loop.
+            restart_delay = min(MAX_RESTART_DELAY, restart_delay * 2 or 1.0)
+        else:
+            restart_delay = 0.0
+        print(f"Worker {pid} exited with status {status}, restarting in {restart_delay:.0f}s")
+        time.sleep(restart_delay)
+        if not stopping:
+            workers[spawn_worker(sock, args.workers, args.log_level)] = time.monotonic()
+    sock.close()
+
+
+if __name__ == "__main__":
+    main()
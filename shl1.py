@@ -1,27 +1,325 @@
 import pandas as pd
 import numpy as np
-from pymongo import MongoClient
+from pymongo import MongoClient, UpdateOne
 import os
 from dotenv import load_dotenv
 import google.generativeai as genai
 from sentence_transformers import SentenceTransformer
 import json
+import re
+import hashlib
 import time
+import asyncio
+from concurrent.futures import ThreadPoolExecutor, wait, TimeoutError as FutureTimeoutError
+from rate_limit import TokenBucket
+from llm_cache import LLMCache, normalize_prompt
+from embedding_cache import EmbeddingCache
+from local_index import LocalVectorIndex, split_list, to_number
+from metrics import Metrics
+from query_parser import QueryParser, TEST_TYPES
+from bm25 import LexicalIndex, reciprocal_rank_fusion
+from catalog_snapshot import read_current
+import threading
+from pymongo.operations import SearchIndexModel
+from bson.binary import Binary, BinaryVectorDtype
 
 load_dotenv()
 
 gemini_key = os.getenv("GEMINI_API_KEY")
 
+LENGTH_PATTERN = r'Assessment Length:\s*(<=|>=|)(\d+)(?:-(\d+)|)'
+
+LLM_MODES = ("always", "auto", "off")
+
+PLAN_GENERATION_CONFIG = {"response_mime_type": "application/json"}
+
+FILTER_FIELDS = ["assessment_length", "test_type", "job_levels", "languages"]
+
+EMBEDDING_BACKENDS = ("torch", "onnx", "onnx-int8")
+
+# Dynamically quantized export shipped alongside the ONNX model on the Hub.
+ONNX_INT8_FILE = "onnx/model_quint8_avx2.onnx"
+
+EMBEDDING_STORAGES = ("list", "float32")
+
+# Wait before retrying a failed BM25 build (e.g. Mongo unreachable at startup).
+LEXICAL_RETRY_SECONDS = 30.0
+
+def embedding_model_id(name, backend="torch"):
+    # Quantized backends produce slightly different vectors, so they get
+    # their own embedding cache namespace.
+    return name if backend == "torch" else f"{name}+{backend}"
+
+def load_embedding_model(name, backend="torch", threads=None):
+    if backend not in EMBEDDING_BACKENDS:
+        raise ValueError(f"Unknown embedding backend: {backend}")
+    if threads:
+        import torch
+        torch.set_num_threads(threads)
+    if backend == "torch":
+        return SentenceTransformer(name)
+
+    model_kwargs = {"provider": "CPUExecutionProvider"}
+    if threads:
+        import onnxruntime
+        session_options = onnxruntime.SessionOptions()
+        session_options.intra_op_num_threads = threads
+        model_kwargs["session_options"] = session_options
+    if backend == "onnx-int8":
+        model_kwargs["file_name"] = ONNX_INT8_FILE
+    return SentenceTransformer(name, backend="onnx", model_kwargs=model_kwargs)
+
 class AssessmentSearchSystem:
-    def __init__(self, mongodb_uri, collection_name="tests"):
-        self.client = MongoClient(mongodb_uri)
+    def __init__(self, mongodb_uri, collection_name="tests", max_pool_size=50,
+                 llm_requests_per_minute=15, llm_burst=5, io_workers=8, embedding_workers=1,
+                 max_parallel_skills=4, search_deadline=60.0, embedding_batch_size=64,
+                 llm_cache=None, embedding_cache=None, index_backend="atlas",
+                 local_index=None, local_index_path=None,
+                 prefilter_fields=("assessment_length", "test_type"), candidate_multiplier=20,
+                 offline=False, gemini_model=None, embedding_model=None, metrics=None,
+                 llm_mode="auto", query_parser=None, structured_llm=True,
+                 hybrid_search=True, hybrid_depth=3, hybrid_candidate_multiplier=5, rrf_k=60,
+                 embedding_backend="torch", embedding_threads=None, embedding_storage="float32",
+                 index_quantization=None, rescore_multiplier=4, vector_quantization=None,
+                 catalog_version_ttl=30.0, snapshot_dir=None, refine_budget=0.5):
+        self.client = MongoClient(mongodb_uri, maxPoolSize=max_pool_size, connect=False)
         self.db = self.client['assessment_search']
         self.collection = self.db[collection_name]
+        self.catalog_meta = self.db['catalog_meta']
+        self.catalog_version_ttl = catalog_version_ttl
+        self.cached_catalog_version = None
+        self.catalog_version_checked = 0.0
         
         api_key = gemini_key
         genai.configure(api_key=api_key)
-        self.embedding_model = SentenceTransformer('all-MiniLM-L6-v2')
-        self.gemini_model = genai.GenerativeModel('gemini-2.0-flash')
+        self.embedding_model_name = 'all-MiniLM-L6-v2'
+        self.embedding_backend = embedding_backend
+        # Offline mode replays recorded LLM and embedding responses only.
+        self.offline = offline
+        if embedding_model is not None:
+            self.embedding_model = embedding_model
+        elif offline:
+            self.embedding_model = None
+        else:
+            self.embedding_model = load_embedding_model(self.embedding_model_name, embedding_backend, embedding_threads)
+        if embedding_cache is None:
+            embedding_cache = EmbeddingCache(model_name=embedding_model_id(self.embedding_model_name, embedding_backend))
+        self.embedding_cache = embedding_cache
+        if embedding_storage not in EMBEDDING_STORAGES:
+            raise ValueError(f"Unknown embedding storage: {embedding_storage}")
+        self.embedding_storage = embedding_storage
+        # Atlas-side index quantization ("scalar" or "binary"); Atlas rescores
+        # against the stored full-fidelity vectors itself.
+        self.vector_quantization = vector_quantization
+        self.gemini_model_name = 'gemini-2.0-flash'
+        self.gemini_model = gemini_model if gemini_model is not None else genai.GenerativeModel(self.gemini_model_name)
+        self.llm_cache = llm_cache if llm_cache is not None else LLMCache()
+        self.llm_bucket = TokenBucket(llm_requests_per_minute / 60.0, llm_burst)
+        self.io_executor = ThreadPoolExecutor(max_workers=io_workers, thread_name_prefix="mongo")
+        self.embedding_executor = ThreadPoolExecutor(max_workers=embedding_workers, thread_name_prefix="embed")
+        self.max_parallel_skills = max_parallel_skills
+        self.search_deadline = search_deadline
+        # Share of the remaining deadline the per-skill refine calls may use;
+        # the rest is kept for embedding and searching the skills that made it.
+        self.refine_budget = refine_budget
+        self.embedding_batch_size = embedding_batch_size
+        self.prefilter_fields = prefilter_fields
+        self.candidate_multiplier = candidate_multiplier
+        self.index_backend = index_backend
+        self.local_index = None
+        self.snapshot_dir = snapshot_dir
+        self.index_options = {"quantization": index_quantization, "rescore_multiplier": rescore_multiplier}
+        if index_backend == "local":
+            index_options = self.index_options
+            if local_index is not None:
+                self.local_index = local_index
+            elif snapshot_dir:
+                self.local_index = LocalVectorIndex.from_snapshot(snapshot_dir, **index_options)
+            elif local_index_path:
+                self.local_index = LocalVectorIndex.load(local_index_path, **index_options)
+            else:
+                self.local_index = LocalVectorIndex.from_collection(self.collection, **index_options)
+        elif index_backend != "atlas":
+            raise ValueError(f"Unknown index backend: {index_backend}")
+        if llm_mode not in LLM_MODES:
+            raise ValueError(f"Unknown LLM mode: {llm_mode}")
+        self.llm_mode = llm_mode
+        self.structured_llm = structured_llm
+        self.hybrid_search = hybrid_search
+        self.hybrid_depth = hybrid_depth
+        self.hybrid_candidate_multiplier = hybrid_candidate_multiplier
+        self.rrf_k = rrf_k
+        self.lexical_index = None
+        self.lexical_lock = threading.Lock()
+        # Bumped on every catalog change; an index built for an older
+        # generation keeps serving until a rebuild catches up.
+        self.lexical_generation = 0
+        self.lexical_index_generation = 0
+        self.lexical_build = None
+        self.lexical_retry_at = 0.0
+        if query_parser is not None:
+            self.query_parser = query_parser
+        elif self.local_index is not None:
+            self.query_parser = QueryParser.from_documents(self.local_index.documents)
+        else:
+            self.query_parser = QueryParser()
+        self.metrics = metrics if metrics is not None else Metrics()
+        self._register_cache_metrics()
+        self.ready = False
+
+    def _register_cache_metrics(self):
+        for cache_name, cache in (("llm_cache", self.llm_cache), ("embedding_cache", self.embedding_cache)):
+            self.metrics.register_callback(
+                f"{cache_name}_hits_total", "counter", f"{cache_name} hits",
+                lambda cache=cache: cache.hits
+            )
+            self.metrics.register_callback(
+                f"{cache_name}_misses_total", "counter", f"{cache_name} misses",
+                lambda cache=cache: cache.misses
+            )
+            self.metrics.register_callback(
+                f"{cache_name}_hit_ratio", "gauge", f"{cache_name} hit ratio",
+                lambda cache=cache: cache.stats()["hit_rate"]
+            )
+
+    def _build_lexical_index(self, generation):
+        if self.local_index is not None:
+            return generation, LexicalIndex(self.local_index.documents)
+        return generation, LexicalIndex.from_collection(self.collection)
+
+    def _install_lexical_index(self, generation, lexical_index):
+        # Caller holds lexical_lock. A slow build never replaces a newer index.
+        if self.lexical_index is None or generation >= self.lexical_index_generation:
+            self.lexical_index = lexical_index
+            self.lexical_index_generation = generation
+
+    def _lexical_built(self, build):
+        with self.lexical_lock:
+            self.lexical_build = None
+            try:
+                generation, lexical_index = build.result()
+            except Exception as e:
+                print(f"Error building lexical index, retrying in {LEXICAL_RETRY_SECONDS:.0f}s: {e}")
+                self.lexical_retry_at = time.monotonic() + LEXICAL_RETRY_SECONDS
+                return
+            self._install_lexical_index(generation, lexical_index)
+
+    def _lexical_index(self, block=False):
+        # Returns the current BM25 index without waiting for a rebuild: a
+        # stale index keeps serving while io_executor builds its replacement,
+        # and searches are vector-only until the first build lands.
+        if not self.hybrid_search:
+            return None
+        with self.lexical_lock:
+            lexical_index = self.lexical_index
+            build = self.lexical_build
+            started = False
+            if (build is None and time.monotonic() >= self.lexical_retry_at
+                    and (lexical_index is None or self.lexical_index_generation != self.lexical_generation)):
+                build = self.lexical_build = self.io_executor.submit(self._build_lexical_index, self.lexical_generation)
+                started = True
+        if started:
+            build.add_done_callback(self._lexical_built)
+        if lexical_index is None and block and build is not None:
+            try:
+                return build.result()[1]
+            except Exception:
+                return None
+        return lexical_index
+
+    def _invalidate_lexical_index(self):
+        with self.lexical_lock:
+            self.lexical_generation += 1
+            self.lexical_retry_at = 0.0
+
+    def catalog_version(self):
+        # Changes whenever the catalog is re-ingested, so cached responses
+        # keyed on it go stale with the catalog.
+        if self.local_index is not None:
+            if self.snapshot_dir:
+                self._refresh_snapshot()
+            return self.local_index.version or "local"
+        now = time.monotonic()
+        if self.cached_catalog_version is None or now - self.catalog_version_checked > self.catalog_version_ttl:
+            try:
+                doc = self.catalog_meta.find_one({'_id': 'catalog'})
+                version = doc.get('version', 0) if doc else 0
+                if self.cached_catalog_version is not None and version != self.cached_catalog_version:
+                    # Another process re-ingested the catalog; rebuild BM25 from it.
+                    self._invalidate_lexical_index()
+                self.cached_catalog_version = version
+            except Exception as e:
+                print(f"Error reading catalog version: {e}")
+            self.catalog_version_checked = now
+        return self.cached_catalog_version
+
+    def _refresh_snapshot(self):
+        # Picks up a new CURRENT snapshot at most every catalog_version_ttl
+        # seconds and swaps the index in one assignment.
+        now = time.monotonic()
+        if now - self.catalog_version_checked <= self.catalog_version_ttl:
+            return
+        self.catalog_version_checked = now
+        try:
+            version = read_current(self.snapshot_dir)
+            if version is None or version == self.local_index.version:
+                return
+            local_index = LocalVectorIndex.from_snapshot(self.snapshot_dir, version, **self.index_options)
+            lexical_index = LexicalIndex(local_index.documents) if self.hybrid_search else None
+        except Exception as e:
+            print(f"Error loading catalog snapshot: {e}")
+            return
+        with self.lexical_lock:
+            self.local_index = local_index
+            self.lexical_generation += 1
+            if lexical_index is not None:
+                self._install_lexical_index(self.lexical_generation, lexical_index)
+        self.query_parser = QueryParser.from_documents(local_index.documents)
+        print(f"Switched to catalog snapshot {version}")
+
+    async def acatalog_version(self):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.io_executor, self.catalog_version)
+
+    def _bump_catalog_version(self):
+        self.catalog_meta.update_one({'_id': 'catalog'}, {'$inc': {'version': 1}}, upsert=True)
+        self.cached_catalog_version = None
+        self._invalidate_lexical_index()
+
+    def preload(self):
+        # Builds what can be shared copy-on-write with forked workers. Must not
+        # start threads, open connections or run the model.
+        if self.local_index is not None and self.hybrid_search:
+            generation, lexical_index = self._build_lexical_index(self.lexical_generation)
+            with self.lexical_lock:
+                self._install_lexical_index(generation, lexical_index)
+
+    def after_fork(self, workers=1):
+        self.llm_cache.after_fork()
+        # Each worker gets its share of the LLM quota.
+        self.llm_bucket = TokenBucket(self.llm_bucket.rate / workers, max(1, self.llm_bucket.capacity // workers))
+
+    def warm_up(self):
+        if self.embedding_model is not None:
+            self.embedding_model.encode("warm up")
+        self._lexical_index(block=True)
+        if self.index_backend == "local":
+            self.ready = True
+            return
+        try:
+            self.client.admin.command('ping')
+            self.query_parser = QueryParser.from_collection(self.collection)
+        except Exception as e:
+            print(f"Error connecting to MongoDB: {e}")
+        self.ready = True
+
+    def close(self):
+        self.ready = False
+        self.io_executor.shutdown(wait=False)
+        self.embedding_executor.shutdown(wait=False)
+        self.llm_cache.close()
+        self.embedding_cache.close()
+        self.client.close()
     
     def create_document_text(self, row):
         document_text = f"""
@@ -34,15 +332,100 @@ class AssessmentSearchSystem:
         """
         return document_text.strip()
     
+    def _encode(self, texts, batch_size=None):
+        if self.offline:
+            raise RuntimeError(f"No recorded embedding for {len(texts)} text(s) in offline mode")
+        embeddings = self.embedding_model.encode(
+            list(texts),
+            batch_size=batch_size or self.embedding_batch_size,
+            convert_to_numpy=True
+        )
+        return np.ascontiguousarray(embeddings, dtype=np.float32)
+
+    def generate_embeddings(self, texts, batch_size=None, use_cache=True):
+        with self.metrics.span("generate_embedding"):
+            texts = list(texts)
+            if not use_cache:
+                return self._encode(texts, batch_size)
+
+            cached = [self.embedding_cache.get(text) for text in texts]
+            missing = [i for i, embedding in enumerate(cached) if embedding is None]
+            if missing:
+                encoded = self._encode([texts[i] for i in missing], batch_size)
+                for i, embedding in zip(missing, encoded):
+                    self.embedding_cache.set(texts[i], embedding)
+                    cached[i] = embedding
+            if not texts:
+                return np.empty((0, 0), dtype=np.float32)
+            return np.ascontiguousarray(np.stack(cached), dtype=np.float32)
+
     def generate_embedding(self, text):
         try:
-            embedding = self.embedding_model.encode(text)
-            return embedding.tolist()
+            return self.generate_embeddings([text])[0]
         except Exception as e:
             print(f"Error generating embedding: {e}")
             return None
-    
-    def refine_query(self, query):
+
+    async def agenerate_embeddings(self, texts, batch_size=None):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.embedding_executor, self.generate_embeddings, texts, batch_size)
+
+    async def agenerate_embedding(self, text):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.embedding_executor, self.generate_embedding, text)
+
+    def _record_usage(self, stage, response):
+        self.metrics.inc("llm_requests_total", stage=stage)
+        usage = getattr(response, "usage_metadata", None)
+        if usage is not None:
+            self.metrics.inc("llm_tokens_total", getattr(usage, "prompt_token_count", 0) or 0, stage=stage, kind="prompt")
+            self.metrics.inc("llm_tokens_total", getattr(usage, "candidates_token_count", 0) or 0, stage=stage, kind="completion")
+
+    def _generate(self, prompt, stage="llm", generation_config=None, validate=None):
+        with self.metrics.span(stage):
+            cached = self.llm_cache.get(self.gemini_model_name, prompt)
+            if cached is not None:
+                return cached
+            if self.offline:
+                raise RuntimeError("No recorded LLM response for prompt in offline mode")
+            self.llm_bucket.acquire()
+            if generation_config:
+                response = self.gemini_model.generate_content(prompt, generation_config=generation_config)
+            else:
+                response = self.gemini_model.generate_content(prompt)
+            self._record_usage(stage, response)
+            if validate:
+                validate(response.text)
+            self.llm_cache.set(self.gemini_model_name, prompt, response.text)
+            return response.text
+
+    async def _allm_cache(self, fn, *args):
+        # The SQLite tier queries and commits on disk, so it runs in
+        # io_executor; the in-memory tier alone is cheap enough for the loop.
+        if self.llm_cache.disk is None:
+            return fn(*args)
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.io_executor, fn, *args)
+
+    async def _agenerate(self, prompt, stage="llm", generation_config=None, validate=None):
+        with self.metrics.span(stage):
+            cached = await self._allm_cache(self.llm_cache.get, self.gemini_model_name, prompt)
+            if cached is not None:
+                return cached
+            if self.offline:
+                raise RuntimeError("No recorded LLM response for prompt in offline mode")
+            await self.llm_bucket.acquire_async()
+            if generation_config:
+                response = await self.gemini_model.generate_content_async(prompt, generation_config=generation_config)
+            else:
+                response = await self.gemini_model.generate_content_async(prompt)
+            self._record_usage(stage, response)
+            if validate:
+                validate(response.text)
+            await self._allm_cache(self.llm_cache.set, self.gemini_model_name, prompt, response.text)
+            return response.text
+
+    def _refine_prompt(self, query):
         prompt = f"""
         the user query is {query}
         You are a search query optimizer for an testing solutions database. 
@@ -71,102 +454,309 @@ class AssessmentSearchSystem:
         Languages: English (USA),
         Assessment Length: 17
         """
-        
-        response = self.gemini_model.generate_content(prompt)
-        refined_query = response.text.strip()
+        return prompt
+
+    def _local_refine(self, query):
+        if self.llm_mode == "always":
+            return None
+        parsed = self.query_parser.parse(query)
+        if parsed['ambiguous'] and self.llm_mode == "auto":
+            return None
+        self.metrics.inc("local_query_parses_total")
+        return self.query_parser.to_refined(query, parsed)
+
+    def refine_query(self, query):
+        refined_query = self._local_refine(query)
+        if refined_query is None:
+            refined_query = self._generate(self._refine_prompt(query), "refine_query").strip()
         return refined_query
-    
-    def extract_skills(self, query):
+
+    async def arefine_query(self, query):
+        refined_query = self._local_refine(query)
+        if refined_query is None:
+            refined_query = (await self._agenerate(self._refine_prompt(query), "refine_query")).strip()
+        return refined_query
+
+    def _skills_prompt(self, query):
         prompt = f"""
         From the following query, extract a list of only at most 7 essential and distinct skills:
         {query}
         Return only the skills as a comma-separated list, without any additional text or explanation.
         """
-        response = self.gemini_model.generate_content(prompt)
-        skills = [skill.strip() for skill in response.text.split(',')]
+        return prompt
+
+    def extract_skills(self, query):
+        if self.llm_mode == "off":
+            return self.query_parser.extract_skills(query)
+        text = self._generate(self._skills_prompt(query), "extract_skills")
+        skills = [skill.strip() for skill in text.split(',')]
         return skills
 
-    def process_csv_and_create_embeddings(self, csv_file):
-        df = pd.read_csv(csv_file)
-        print(f"Processing {len(df)} records from {csv_file}")
-        for index, row in df.iterrows():
+    async def aextract_skills(self, query):
+        if self.llm_mode == "off":
+            return self.query_parser.extract_skills(query)
+        text = await self._agenerate(self._skills_prompt(query), "extract_skills")
+        skills = [skill.strip() for skill in text.split(',')]
+        return skills
 
-            document_text = self.create_document_text(row)
-            
-            embedding = self.generate_embedding(document_text)
-            
-            if embedding:
-                document = {
-                    'name': row.get('Name', ''),
-                    'url': row.get('URL', ''),
-                    'remote_testing': row.get('Remote Testing', ''),
-                    'adaptive': row.get('Adaptive/IRT', ''),
-                    'test_type': row.get('Test Type', ''),
-                    'description': row.get('Description', ''),
-                    'job_levels': row.get('Job Levels', ''),
-                    'languages': row.get('Languages', ''),
-                    'assessment_length': row.get('Assessment Length', ''),
-                    'text': document_text,
-                    'embedding': embedding
-                }
-                
-                self.collection.update_one(
-                    {'name': document['name']},
-                    {'$set': document},
-                    upsert=True
-                )
-            
-            if (index + 1) % 50 == 0:
-                print(f"Processed {index + 1} records...")
-        
-        print(f"Completed processing {len(df)} records.")
+    def _plan_prompt(self, query):
+        test_types = ", ".join(f"'{test_type}'" for test_type in TEST_TYPES)
+        prompt = f"""
+        the user query is {query}
+        You are a search query optimizer for an testing solutions database.
+        Extract at most 7 essential and distinct skills from the query. For every skill write a short
+        refined search query describing an assessment that tests it, and pick the matching test types
+        from {test_types}.
+        Also extract the constraints that apply to the whole query:
+        - assessment_length: duration of the test, null if nothing is mentioned. If query like about an hour
+          then "<=60". If query like 30-40 mins then "30-40". Otherwise "<=N" or ">=N".
+        - languages: spoken languages mentioned in the query.
+        - job_levels: target job levels (Entry-level, Mid-Professional, Manager, etc.).
 
-    def search(self, query, limit):
-        refined = self.refine_query(query)
-        print(refined)
-        query_embedding = self.generate_embedding(refined)
+        Respond with JSON only, in exactly this shape:
+        {{"skills": [{{"skill": "...", "refined_query": "...", "test_types": ["..."]}}],
+          "constraints": {{"assessment_length": null, "languages": [], "job_levels": []}}}}
+        """
+        return prompt
 
-        if not query_embedding:
-            return []
+    def _parse_plan(self, text):
+        plan = json.loads(text)
+        if not isinstance(plan, dict) or set(plan) != {"skills", "constraints"}:
+            raise ValueError("plan must be an object with skills and constraints")
+
+        skills = plan["skills"]
+        if not isinstance(skills, list) or not 1 <= len(skills) <= 7:
+            raise ValueError("plan must contain between 1 and 7 skills")
+        for item in skills:
+            if not isinstance(item, dict):
+                raise ValueError("each skill must be an object")
+            for field in ("skill", "refined_query"):
+                if not isinstance(item.get(field), str) or not item[field].strip():
+                    raise ValueError(f"skill {field} must be a non-empty string")
+            test_types = item.get("test_types", [])
+            if not isinstance(test_types, list) or any(t not in TEST_TYPES for t in test_types):
+                raise ValueError("skill test_types must be catalogue test types")
 
-        import re
-        length_pattern = r'Assessment Length:\s*(<=|>=|)(\d+)(?:-(\d+)|)'
-        length_match = re.search(length_pattern, refined)
-
-        pipeline = [
-            {
-                "$vectorSearch": {
-                    "index": "vector_index",
-                    "path": "embedding",
-                    "queryVector": query_embedding,
-                    "numCandidates": 600,
-                    "limit": 100
-                }
+        constraints = plan["constraints"]
+        if not isinstance(constraints, dict):
+            raise ValueError("constraints must be an object")
+        length = constraints.get("assessment_length")
+        if length is not None and not (isinstance(length, str) and re.fullmatch(r'(<=|>=)?\d+(-\d+)?', length.strip())):
+            raise ValueError("assessment_length must be null or like <=40, >=20 or 30-40")
+        for field in ("languages", "job_levels"):
+            values = constraints.get(field, [])
+            if not isinstance(values, list) or any(not isinstance(value, str) for value in values):
+                raise ValueError(f"{field} must be a list of strings")
+        return plan
+
+    def _planned_queries(self, plan):
+        constraints = plan["constraints"]
+        length = constraints.get("assessment_length")
+        refined = []
+        for item in plan["skills"]:
+            parsed = {
+                'assessment_length': length.strip() if length else None,
+                'test_types': item.get("test_types", []),
+                'languages': constraints.get("languages", []),
+                'job_levels': constraints.get("job_levels", [])
             }
-        ]
+            refined.append((item["skill"].strip(), self.query_parser.to_refined(item["refined_query"], parsed)))
+        return refined
 
-        if length_match:
-            operator = length_match.group(1)
-            first_num = float(length_match.group(2))
-            second_num = length_match.group(3)
+    def _use_plan(self):
+        return self.structured_llm and self.llm_mode != "off"
+
+    def plan_query(self, query):
+        text = self._generate(self._plan_prompt(query), "plan_query", PLAN_GENERATION_CONFIG, self._parse_plan)
+        return self._planned_queries(self._parse_plan(text))
+
+    async def aplan_query(self, query):
+        text = await self._agenerate(self._plan_prompt(query), "plan_query", PLAN_GENERATION_CONFIG, self._parse_plan)
+        return self._planned_queries(self._parse_plan(text))
+
+    def _catalog_document(self, row, document_text):
+        document = {
+            'name': row.get('Name', ''),
+            'url': row.get('URL', ''),
+            'remote_testing': row.get('Remote Testing', ''),
+            'adaptive': row.get('Adaptive/IRT', ''),
+            'test_type': split_list(row.get('Test Type', '')),
+            'description': row.get('Description', ''),
+            'job_levels': split_list(row.get('Job Levels', '')),
+            'languages': split_list(row.get('Languages', '')),
+            'assessment_length': self._length_value(row.get('Assessment Length', '')),
+            'text': document_text,
+            'text_hash': self._text_hash(document_text)
+        }
+        # Covers fields left out of the embedded text (URL, remote testing,
+        # adaptive), which still have to reach Mongo when they change.
+        document['document_hash'] = hashlib.sha256(
+            json.dumps(document, sort_keys=True, default=str).encode('utf-8')
+        ).hexdigest()
+        return document
+
+    def _text_hash(self, document_text):
+        # Covers the model and the storage format too, so switching either
+        # re-embeds the whole catalog instead of mixing vectors.
+        model_id = embedding_model_id(self.embedding_model_name, self.embedding_backend)
+        key = f"{model_id}\n{self.embedding_storage}\n{document_text}"
+        return hashlib.sha256(key.encode('utf-8')).hexdigest()
+
+    def process_csv_and_create_embeddings(self, csv_file, chunk_size=256, snapshot_dir=None):
+        existing_hashes = {
+            doc['name']: (doc.get('text_hash'), doc.get('document_hash'))
+            for doc in self.collection.find({}, {'_id': 0, 'name': 1, 'text_hash': 1, 'document_hash': 1})
+        }
+        print(f"Processing records from {csv_file}")
+
+        processed = 0
+        written = 0
+        embedded = 0
+        for chunk in pd.read_csv(csv_file, chunksize=chunk_size, dtype=str):
+            documents = [
+                self._catalog_document(row, self.create_document_text(row))
+                for _, row in chunk.iterrows()
+            ]
+            processed += len(documents)
+            # Only a new document text needs a new embedding; other field
+            # changes are written without re-embedding.
+            reembed = []
+            operations = []
+            for doc in documents:
+                text_hash, document_hash = existing_hashes.get(doc['name'], (None, None))
+                if text_hash != doc['text_hash']:
+                    reembed.append(doc)
+                elif document_hash != doc['document_hash']:
+                    operations.append(UpdateOne({'name': doc['name']}, {'$set': doc}, upsert=True))
+                    existing_hashes[doc['name']] = (doc['text_hash'], doc['document_hash'])
+
+            if reembed:
+                embeddings = self.generate_embeddings([doc['text'] for doc in reembed], use_cache=False)
+                for document, embedding in zip(reembed, embeddings):
+                    document['embedding'] = self._stored_embedding(embedding)
+                    operations.append(UpdateOne({'name': document['name']}, {'$set': document}, upsert=True))
+                    existing_hashes[document['name']] = (document['text_hash'], document['document_hash'])
+                embedded += len(reembed)
+            if operations:
+                self.collection.bulk_write(operations, ordered=False)
+                written += len(operations)
 
-            if operator == "<=":
-                length_filter = {"$lte": first_num}
-            elif operator == ">=":
-                length_filter = {"$gte": first_num}
-            elif second_num: 
-                length_filter = {
-                    "$gte": first_num,
-                    "$lte": float(second_num)
-                }
-            else: 
-                length_filter = {"$eq": first_num}
-
-            pipeline.append({
-                "$match": {
-                    "assessment_length": length_filter
-                }
-            })
+            print(f"Processed {processed} records, {written} new or changed...")
+
+        if written:
+            self._bump_catalog_version()
+        print(f"Completed processing {processed} records, wrote {written}, re-embedded {embedded}.")
+        snapshot_dir = snapshot_dir or self.snapshot_dir
+        if snapshot_dir:
+            version = self.export_snapshot(snapshot_dir)
+            print(f"Wrote catalog snapshot {version} to {snapshot_dir}")
+        return written
+
+    def _stored_embedding(self, embedding):
+        if self.embedding_storage == "float32":
+            # Packed BSON vector: 4 bytes per dimension instead of a
+            # float64 array element with its own type tag and key.
+            return Binary.from_vector(embedding.tolist(), BinaryVectorDtype.FLOAT32)
+        return embedding.tolist()
+
+    def _length_value(self, value):
+        number = to_number(value)
+        return None if np.isnan(number) else number
+
+    def create_vector_index(self, name="vector_index"):
+        vector_field = {
+            "type": "vector",
+            "path": "embedding",
+            "numDimensions": self.embedding_model.get_sentence_embedding_dimension(),
+            "similarity": "cosine"
+        }
+        if self.vector_quantization:
+            vector_field["quantization"] = self.vector_quantization
+        definition = {
+            "fields": [vector_field] + [{"type": "filter", "path": field} for field in FILTER_FIELDS]
+        }
+        model = SearchIndexModel(definition=definition, name=name, type="vectorSearch")
+        existing = [index["name"] for index in self.collection.list_search_indexes()]
+        if name in existing:
+            self.collection.update_search_index(name, definition)
+        else:
+            self.collection.create_search_index(model)
+
+    def export_local_index(self, path):
+        LocalVectorIndex.from_collection(self.collection).save(path)
+
+    def export_snapshot(self, root):
+        model_id = embedding_model_id(self.embedding_model_name, self.embedding_backend)
+        return LocalVectorIndex.from_collection(self.collection).save_snapshot(root, model_id)
+
+    def _length_filter(self, refined):
+        length_match = re.search(LENGTH_PATTERN, refined)
+        if not length_match:
+            return None
+
+        operator = length_match.group(1)
+        first_num = float(length_match.group(2))
+        second_num = length_match.group(3)
+
+        if operator == "<=":
+            return {"$lte": first_num}
+        elif operator == ">=":
+            return {"$gte": first_num}
+        elif second_num: 
+            return {
+                "$gte": first_num,
+                "$lte": float(second_num)
+            }
+        else: 
+            return {"$eq": first_num}
+
+    def _field_values(self, refined, label):
+        match = re.search(rf'{label}:\s*(.+)', refined)
+        if not match:
+            return []
+        return split_list(match.group(1))
+
+    def _filters(self, refined):
+        filters = {}
+        length_filter = self._length_filter(refined)
+        if length_filter and "assessment_length" in self.prefilter_fields:
+            filters["assessment_length"] = length_filter
+        if "test_type" in self.prefilter_fields:
+            labelled = " ".join(self._field_values(refined, "Test Type")).casefold()
+            test_types = [t for t in TEST_TYPES if t.casefold() in labelled]
+            if test_types:
+                filters["test_type"] = test_types
+        for field, label in (("job_levels", "Job Levels"), ("languages", "Languages")):
+            if field in self.prefilter_fields:
+                values = self._field_values(refined, label)
+                if values:
+                    filters[field] = values
+        return filters
+
+    def _search_filter(self, filters):
+        clauses = []
+        for field, condition in filters.items():
+            if field == "assessment_length":
+                clauses.append({field: condition})
+            else:
+                clauses.append({field: {"$in": condition}})
+        if not clauses:
+            return None
+        return clauses[0] if len(clauses) == 1 else {"$and": clauses}
+
+    def _build_pipeline(self, refined, query_embedding, limit, candidate_multiplier=None):
+        vector_search = {
+            "index": "vector_index",
+            "path": "embedding",
+            "queryVector": query_embedding.tolist(),
+            "numCandidates": max(limit * (candidate_multiplier or self.candidate_multiplier), 100),
+            "limit": limit
+        }
+        search_filter = self._search_filter(self._filters(refined))
+        if search_filter:
+            vector_search["filter"] = search_filter
+
+        pipeline = [{"$vectorSearch": vector_search}]
 
         pipeline.append({
             "$project": {
@@ -183,28 +773,76 @@ class AssessmentSearchSystem:
                 "score": {"$meta": "vectorSearchScore"}
             }
         })
+        return pipeline
 
-        pipeline.append({"$limit": limit})
-
+    def _run_pipeline(self, pipeline):
         try:
             results = list(self.collection.aggregate(pipeline))
             return results
         except Exception as e:
             print(f"Error during search: {e}")
+            self.metrics.inc("errors_total", stage="vector_search")
             return []
 
-    def search_multiple_skills(self, query, limit_per_skill=3, final_limit=10):
-        skills = self.extract_skills(query)
-        print(skills)
-        all_results = []
-        
-        base_refined = self.refine_query(query)
-        time.sleep(15)
-        print("-----")
-        
-        import re
-        length_pattern = r'Assessment Length:\s*(<=|>=|)(\d+)(?:-(\d+)|)'
-        length_match = re.search(length_pattern, base_refined)
+    async def _arun_pipeline(self, pipeline):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.io_executor, self._run_pipeline, pipeline)
+
+    def _search_depth(self, limit):
+        if self.hybrid_search:
+            return limit * self.hybrid_depth, self.hybrid_candidate_multiplier
+        return limit, self.candidate_multiplier
+
+    def _fuse(self, refined, vector_results, limit):
+        if not self.hybrid_search:
+            return vector_results
+        with self.metrics.span("lexical_search"):
+            lexical_index = self._lexical_index()
+            if lexical_index is None:
+                return vector_results[:limit]
+            lexical_results = lexical_index.search(refined, limit * self.hybrid_depth, self._filters(refined))
+            return reciprocal_rank_fusion([vector_results, lexical_results], limit, self.rrf_k)
+
+    def _vector_search(self, refined, query_embedding, limit):
+        depth, multiplier = self._search_depth(limit)
+        with self.metrics.span("vector_search"):
+            if self.local_index is not None:
+                results = self.local_index.search(query_embedding, depth, self._filters(refined))
+            else:
+                results = self._run_pipeline(self._build_pipeline(refined, query_embedding, depth, multiplier))
+        return self._fuse(refined, results, limit)
+
+    async def _avector_search(self, refined, query_embedding, limit):
+        # Local scoring and BM25 are CPU-bound, so both run in io_executor
+        # rather than on the event loop.
+        loop = asyncio.get_running_loop()
+        if self.local_index is not None:
+            return await loop.run_in_executor(self.io_executor, self._vector_search, refined, query_embedding, limit)
+        depth, multiplier = self._search_depth(limit)
+        with self.metrics.span("vector_search"):
+            results = await self._arun_pipeline(self._build_pipeline(refined, query_embedding, depth, multiplier))
+        return await loop.run_in_executor(self.io_executor, self._fuse, refined, results, limit)
+
+    def search(self, query, limit):
+        refined = self.refine_query(query)
+        query_embedding = self.generate_embedding(refined)
+
+        if query_embedding is None:
+            return []
+
+        return self._vector_search(refined, query_embedding, limit)
+
+    async def asearch(self, query, limit):
+        refined = await self.arefine_query(query)
+        query_embedding = await self.agenerate_embedding(refined)
+
+        if query_embedding is None:
+            return []
+
+        return await self._avector_search(refined, query_embedding, limit)
+
+    def _length_requirement(self, base_refined):
+        length_match = re.search(LENGTH_PATTERN, base_refined)
         
         length_requirement = ""
         if length_match:
@@ -218,20 +856,301 @@ class AssessmentSearchSystem:
                 length_requirement = f"\nAssessment Length: <={second_num}"
             else:
                 length_requirement = f"\nAssessment Length: {first_num}-{second_num}"
-        
-        for skill in skills:
-            skill_query = f"""
+        return length_requirement
+
+    def _skill_query(self, skill, length_requirement):
+        skill_query = f"""
             Looking for assessment focused on {skill}.
             Description: Tests that evaluate {skill} capabilities.{length_requirement}
             """
-            results = self.search(skill_query, limit_per_skill)
-            all_results.extend(results)
-            print("-----")
-            time.sleep(15)
-
+        return skill_query
 
+    def _merge_results(self, per_skill_results, final_limit):
+        all_results = [result for results in per_skill_results for result in results]
         unique_results = {result['name']: result for result in all_results}.values()
         
         sorted_results = sorted(unique_results, key=lambda x: x.get('score', 0), reverse=True)
         return sorted_results[:final_limit]
 
+    def _completed(self, skills, futures, done):
+        completed = []
+        for skill, future in zip(skills, futures):
+            if future not in done:
+                print(f"Search for skill '{skill}' did not finish before the deadline")
+            elif future.exception() is not None:
+                print(f"Error searching skill '{skill}': {future.exception()}")
+            else:
+                completed.append((skill, future.result()))
+        return completed
+
+    def _refine_deadline(self, now, deadline_at):
+        return now + max(0.0, deadline_at - now) * self.refine_budget
+
+    def _planning_timed_out(self, query):
+        print(f"Planning query '{query}' did not finish before the deadline")
+        self.metrics.inc("planning_timeouts_total")
+
+    def _refine_skills(self, query, executor, deadline_at):
+        # Planning and the per-skill refines share the refine budget; a plan
+        # or extraction that overruns it yields no skills, as in the async path.
+        refine_deadline = self._refine_deadline(time.monotonic(), deadline_at)
+
+        def remaining():
+            return max(0.0, refine_deadline - time.monotonic())
+
+        try:
+            if self._use_plan():
+                try:
+                    return executor.submit(self.plan_query, query).result(timeout=remaining())
+                except FutureTimeoutError:
+                    raise
+                except Exception as e:
+                    print(f"Structured plan failed, falling back: {e}")
+                    self.metrics.inc("plan_fallbacks_total")
+
+            skills_future = executor.submit(self.extract_skills, query)
+            base_future = executor.submit(self.refine_query, query)
+            skills = skills_future.result(timeout=remaining())
+            base_refined = base_future.result(timeout=remaining())
+        except FutureTimeoutError:
+            self._planning_timed_out(query)
+            return []
+        length_requirement = self._length_requirement(base_refined)
+
+        futures = [
+            executor.submit(self.refine_query, self._skill_query(skill, length_requirement))
+            for skill in skills
+        ]
+        done, _ = wait(futures, timeout=remaining())
+        return self._completed(skills, futures, done)
+
+    def search_multiple_skills(self, query, limit_per_skill=3, final_limit=10,
+                               max_parallel_skills=None, deadline=None):
+        deadline_at = time.monotonic() + (self.search_deadline if deadline is None else deadline)
+
+        executor = ThreadPoolExecutor(max_workers=max_parallel_skills or self.max_parallel_skills)
+        try:
+            refined = self._refine_skills(query, executor, deadline_at)
+            if not refined:
+                return []
+
+            embeddings = self.generate_embeddings([skill_refined for _, skill_refined in refined])
+            searched_skills = [skill for skill, _ in refined]
+            futures = [
+                executor.submit(self._vector_search, skill_refined, embedding, limit_per_skill)
+                for (_, skill_refined), embedding in zip(refined, embeddings)
+            ]
+            done, _ = wait(futures, timeout=max(0.0, deadline_at - time.monotonic()))
+            per_skill_results = [results for _, results in self._completed(searched_skills, futures, done)]
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+        return self._merge_results(per_skill_results, final_limit)
+
+    async def asearch_multiple_skills(self, query, limit_per_skill=3, final_limit=10,
+                                      max_parallel_skills=None, deadline=None):
+        results = []
+        async for event, _, event_results in self.astream_multiple_skills(
+                query, limit_per_skill, final_limit, max_parallel_skills, deadline):
+            if event == "final":
+                results = event_results
+        return results
+
+    async def _abounded(self, semaphore, coro):
+        async with semaphore:
+            return await coro
+
+    async def _arun_within_deadline(self, skills, coros, semaphore, deadline_at):
+        loop = asyncio.get_running_loop()
+        tasks = [asyncio.create_task(self._abounded(semaphore, coro)) for coro in coros]
+        if not tasks:
+            return []
+        done, pending = await asyncio.wait(tasks, timeout=max(0.0, deadline_at - loop.time()))
+        for task in pending:
+            task.cancel()
+        return self._completed(skills, tasks, done)
+
+    async def _arefine_skills(self, query, semaphore, deadline_at):
+        loop = asyncio.get_running_loop()
+        refine_deadline = self._refine_deadline(loop.time(), deadline_at)
+
+        def remaining():
+            return max(0.0, refine_deadline - loop.time())
+
+        try:
+            if self._use_plan():
+                try:
+                    return await asyncio.wait_for(self.aplan_query(query), remaining())
+                except asyncio.TimeoutError:
+                    raise
+                except Exception as e:
+                    print(f"Structured plan failed, falling back: {e}")
+                    self.metrics.inc("plan_fallbacks_total")
+
+            skills, base_refined = await asyncio.wait_for(
+                asyncio.gather(self.aextract_skills(query), self.arefine_query(query)),
+                remaining()
+            )
+        except asyncio.TimeoutError:
+            self._planning_timed_out(query)
+            return []
+        length_requirement = self._length_requirement(base_refined)
+
+        return await self._arun_within_deadline(
+            skills,
+            [self.arefine_query(self._skill_query(skill, length_requirement)) for skill in skills],
+            semaphore,
+            refine_deadline
+        )
+
+    async def astream_multiple_skills(self, query, limit_per_skill=3, final_limit=10,
+                                      max_parallel_skills=None, deadline=None):
+        # Yields ("skill", skill, results) as each skill's search completes,
+        # then ("final", None, merged results).
+        loop = asyncio.get_running_loop()
+        deadline_at = loop.time() + (self.search_deadline if deadline is None else deadline)
+        semaphore = asyncio.Semaphore(max_parallel_skills or self.max_parallel_skills)
+
+        refined = await self._arefine_skills(query, semaphore, deadline_at)
+        if not refined:
+            yield "final", None, []
+            return
+
+        embeddings = await self.agenerate_embeddings([skill_refined for _, skill_refined in refined])
+        tasks = [
+            asyncio.create_task(
+                self._abounded(semaphore, self._avector_search(skill_refined, embedding, limit_per_skill))
+            )
+            for (_, skill_refined), embedding in zip(refined, embeddings)
+        ]
+        skills = {task: skill for task, (skill, _) in zip(tasks, refined)}
+        searched = {}
+        pending = set(tasks)
+        try:
+            while pending:
+                timeout = deadline_at - loop.time()
+                if timeout <= 0:
+                    break
+                done, pending = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                for task in sorted(done, key=tasks.index):
+                    if task.exception() is not None:
+                        print(f"Error searching skill '{skills[task]}': {task.exception()}")
+                        continue
+                    searched[task] = task.result()
+                    yield "skill", skills[task], task.result()
+        finally:
+            # Also reached when the consumer stops iterating early.
+            for task in pending:
+                if loop.time() >= deadline_at:
+                    print(f"Search for skill '{skills[task]}' did not finish before the deadline")
+                task.cancel()
+
+        # Merge in skill order so ties break the same way as the sync path.
+        per_skill_results = [searched[task] for task in tasks if task in searched]
+        yield "final", None, self._merge_results(per_skill_results, final_limit)
+
+    def _skill_key(self, skill, refined):
+        constraints = {
+            "assessment_length": self._length_filter(refined),
+            "test_type": self._field_values(refined, "Test Type"),
+            "job_levels": self._field_values(refined, "Job Levels"),
+            "languages": self._field_values(refined, "Languages")
+        }
+        return normalize_prompt(skill), json.dumps(constraints, sort_keys=True)
+
+    async def abatch_search_multiple_skills(self, queries, limit_per_skill=3, final_limit=10,
+                                            max_parallel_queries=None, max_parallel_searches=16,
+                                            chunk_size=256, deadline=None):
+        # Yields (index, results, error) for each query as soon as its own
+        # skills are searched. Within a chunk, identical queries are planned
+        # once, skills (by name and constraints) planned together are embedded
+        # in one batch and each is searched once. Each query has its own
+        # deadline for planning and searching, from when its planning starts.
+        loop = asyncio.get_running_loop()
+        deadline = self.search_deadline if deadline is None else deadline
+        plan_semaphore = asyncio.Semaphore(max_parallel_queries or self.max_parallel_skills)
+        skill_semaphore = asyncio.Semaphore(self.max_parallel_skills)
+        search_semaphore = asyncio.Semaphore(max_parallel_searches)
+
+        async def plan(query):
+            async with plan_semaphore:
+                deadline_at = loop.time() + deadline
+                return deadline_at, await self._arefine_skills(query, skill_semaphore, deadline_at)
+
+        for start in range(0, len(queries), chunk_size):
+            plans = {}
+            indexes = {}
+            for index, query in enumerate(queries[start:start + chunk_size], start):
+                key = normalize_prompt(query)
+                if key not in plans:
+                    plans[key] = asyncio.create_task(plan(query))
+                indexes.setdefault(plans[key], []).append(index)
+            searches = {}
+            finishers = []
+            lines = asyncio.Queue()
+
+            def emit(task, results, error=None):
+                for index in indexes[task]:
+                    lines.put_nowait((index, results, error))
+
+            async def finish(task):
+                deadline_at, refined = task.result()
+                keys = [(skill, self._skill_key(skill, skill_refined)) for skill, skill_refined in refined]
+                try:
+                    done = set()
+                    if keys:
+                        done, _ = await asyncio.wait(
+                            {searches[key] for _, key in keys}, timeout=max(0.0, deadline_at - loop.time())
+                        )
+                    per_skill_results = []
+                    for skill, key in keys:
+                        if searches[key] not in done:
+                            print(f"Search for skill '{skill}' did not finish before the deadline")
+                        elif searches[key].exception() is not None:
+                            print(f"Error searching skill '{skill}': {searches[key].exception()}")
+                        else:
+                            per_skill_results.append(searches[key].result())
+                    emit(task, self._merge_results(per_skill_results, final_limit))
+                except Exception as e:
+                    emit(task, [], str(e))
+
+            async def run():
+                # Plans that finish while a batch is embedding go in the next batch.
+                pending = set(plans.values())
+                while pending:
+                    done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                    planned = []
+                    for task in done:
+                        if task.exception() is not None:
+                            emit(task, [], str(task.exception()))
+                        else:
+                            planned.append(task)
+                    skill_queries = {}
+                    for task in planned:
+                        for skill, skill_refined in task.result()[1]:
+                            key = self._skill_key(skill, skill_refined)
+                            if key not in searches:
+                                skill_queries.setdefault(key, skill_refined)
+                    if skill_queries:
+                        self.metrics.inc("batch_skill_queries_total", len(skill_queries))
+                        try:
+                            embeddings = await self.agenerate_embeddings(list(skill_queries.values()))
+                        except Exception as e:
+                            print(f"Error embedding batch: {e}")
+                            for task in planned:
+                                emit(task, [], str(e))
+                            continue
+                        for (key, skill_refined), embedding in zip(skill_queries.items(), embeddings):
+                            searches[key] = asyncio.create_task(self._abounded(
+                                search_semaphore, self._avector_search(skill_refined, embedding, limit_per_skill)
+                            ))
+                    finishers.extend(asyncio.create_task(finish(task)) for task in planned)
+
+            producer = asyncio.create_task(run())
+            try:
+                for _ in range(min(chunk_size, len(queries) - start)):
+                    yield await lines.get()
+            finally:
+                # Also reached when the consumer stops iterating early.
+                for task in [producer, *plans.values(), *finishers, *searches.values()]:
+                    task.cancel()
@@ -1,16 +1,76 @@
-from fastapi import FastAPI, HTTPException
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from fastapi.encoders import jsonable_encoder
 from pydantic import BaseModel
 from typing import List, Optional
-from shl1 import AssessmentSearchSystem
+from shl1 import AssessmentSearchSystem, embedding_model_id
+from llm_cache import LLMCache
+from embedding_cache import EmbeddingCache
+from request_cache import ResponseCache, SingleFlight
 import os
+import json
+import time
 from dotenv import load_dotenv
 import uvicorn
 load_dotenv()
 
-app = FastAPI()
-
 mongodb_uri = os.getenv('MONGODB_URI')
+llm_cache_path = os.getenv('LLM_CACHE_PATH')
+embedding_cache_dir = os.getenv('EMBEDDING_CACHE_DIR')
+index_backend = os.getenv('INDEX_BACKEND', 'atlas')
+local_index_path = os.getenv('LOCAL_INDEX_PATH')
+catalog_snapshot_dir = os.getenv('CATALOG_SNAPSHOT_DIR')
+llm_mode = os.getenv('LLM_MODE', 'auto')
+structured_llm = os.getenv('STRUCTURED_LLM', '1') != '0'
+hybrid_search = os.getenv('HYBRID_SEARCH', '1') != '0'
+embedding_backend = os.getenv('EMBEDDING_BACKEND', 'torch')
+embedding_threads = int(os.getenv('EMBEDDING_THREADS', '0')) or None
+index_quantization = os.getenv('INDEX_QUANTIZATION') or None
+slow_request_seconds = float(os.getenv('SLOW_REQUEST_SECONDS', '0'))
+response_cache_ttl = float(os.getenv('RESPONSE_CACHE_TTL', '600'))
+response_cache_size = int(os.getenv('RESPONSE_CACHE_SIZE', '1024'))
+batch_max_queries = int(os.getenv('BATCH_MAX_QUERIES', '5000'))
+
+# Identical queries share one pipeline run while in flight, and the result
+# for a normalized query is reused until it expires or the catalog changes.
+response_cache = ResponseCache(max_entries=response_cache_size, ttl=response_cache_ttl)
+single_flight = SingleFlight()
+
+def create_search_system():
+    return AssessmentSearchSystem(
+        mongodb_uri = mongodb_uri,
+        llm_cache = LLMCache(sqlite_path=llm_cache_path),
+        embedding_cache = EmbeddingCache(
+            persist_dir=embedding_cache_dir,
+            model_name=embedding_model_id('all-MiniLM-L6-v2', embedding_backend)
+        ),
+        index_backend = index_backend,
+        local_index_path = local_index_path,
+        snapshot_dir = catalog_snapshot_dir,
+        llm_mode = llm_mode,
+        structured_llm = structured_llm,
+        hybrid_search = hybrid_search,
+        embedding_backend = embedding_backend,
+        embedding_threads = embedding_threads,
+        index_quantization = index_quantization
+    )
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # serve.py preloads the system before forking workers.
+    search_system = getattr(app.state, 'search_system', None)
+    if search_system is None:
+        search_system = create_search_system()
+    search_system.warm_up()
+    app.state.search_system = search_system
+    try:
+        yield
+    finally:
+        search_system.close()
+
+app = FastAPI(lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -20,9 +80,47 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+def record_request(request, status_code, duration):
+    # Label by route template, never the raw path: unmatched URLs would
+    # otherwise each add their own series.
+    route = request.scope.get("route")
+    path = route.path if route is not None else "other"
+    search_system = getattr(request.app.state, "search_system", None)
+    if search_system is not None and path != "/metrics":
+        search_system.metrics.observe("http_request_duration_seconds", duration, path=path)
+        search_system.metrics.inc("http_requests_total", path=path, status=status_code)
+    if slow_request_seconds and duration > slow_request_seconds:
+        print(f"Slow request: {request.method} {request.url.path} took {duration:.3f}s (status {status_code})")
+
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    started = time.perf_counter()
+    response = await call_next(request)
+
+    # call_next returns once the headers are sent; streaming routes are
+    # only done when the last body chunk is, so time until then.
+    body_iterator = response.body_iterator
+
+    async def timed_body():
+        try:
+            async for chunk in body_iterator:
+                yield chunk
+        finally:
+            record_request(request, response.status_code, time.perf_counter() - started)
+
+    response.body_iterator = timed_body()
+    return response
+
 class Query(BaseModel):
     query: str
 
+class BatchItem(BaseModel):
+    id: Optional[str] = None
+    query: str
+
+class BatchQuery(BaseModel):
+    queries: List[BatchItem]
+
 class Assessment(BaseModel):
     url: str
     adaptive_support: str
@@ -38,29 +136,153 @@ class RecommendationResponse(BaseModel):
 async def health_check():
     return {"status": "healthy"}
 
+@app.get("/ready")
+async def readiness_check(request: Request):
+    search_system = getattr(request.app.state, "search_system", None)
+    if search_system is None or not search_system.ready:
+        raise HTTPException(status_code=503, detail="not ready")
+    return {"status": "ready"}
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics(request: Request):
+    search_system = getattr(request.app.state, "search_system", None)
+    if search_system is None:
+        return PlainTextResponse("", media_type="text/plain; version=0.0.4")
+    return PlainTextResponse(search_system.metrics.render(), media_type="text/plain; version=0.0.4")
+
+def build_assessment(result):
+    if isinstance(result['test_type'], list):
+        test_types = result['test_type']
+    else:
+        test_types = result['test_type'].split(',') if isinstance(result['test_type'], str) else [result['test_type']]
+    return Assessment(
+        url=result['url'],
+        adaptive_support="Yes" if result['adaptive'] == "Yes" else "No",
+        description=result['description'],
+        duration=int(result['assessment_length']) if result['assessment_length'] else 0,
+        remote_support="Yes" if result['remote_testing'] == "Yes" else "No",
+        test_type=test_types
+    )
+
+async def cached_recommendations(search_system, query):
+    key = response_cache.key(query, await search_system.acatalog_version())
+    if response_cache_ttl > 0:
+        results = response_cache.get(key)
+        if results is not None:
+            return results, "HIT"
+
+    async def compute():
+        with search_system.metrics.span("search_multiple_skills"):
+            results = await search_system.asearch_multiple_skills(query, final_limit=10)
+        # An empty list usually means the pipeline failed or hit its deadline.
+        if results and response_cache_ttl > 0:
+            response_cache.set(key, results)
+        return results
+
+    results, shared = await single_flight.do(key, compute)
+    return results, "COALESCED" if shared else "MISS"
+
 @app.post("/recommend")
-async def get_recommendations(query: Query):
+async def get_recommendations(query: Query, request: Request, response: Response):
     try:
-        search_system = AssessmentSearchSystem(mongodb_uri = mongodb_uri)
-        results = search_system.search_multiple_skills(query.query, limit=10)
+        search_system = request.app.state.search_system
+        results, cache_status = await cached_recommendations(search_system, query.query)
+        response.headers["X-Cache"] = cache_status
+        search_system.metrics.inc("response_cache_requests_total", status=cache_status)
         
-        recommended_assessments = []
-        for result in results:
-            test_types = result['test_type'].split(',') if isinstance(result['test_type'], str) else [result['test_type']]
-            assessment = Assessment(
-                url=result['url'],
-                adaptive_support="Yes" if result['adaptive'] == "Yes" else "No",
-                description=result['description'],
-                duration=int(result['assessment_length']) if result['assessment_length'] else 0,
-                remote_support="Yes" if result['remote_testing'] == "Yes" else "No",
-                test_type=test_types
-            )
-            recommended_assessments.append(assessment)
+        with search_system.metrics.span("build_response"):
+            recommended_assessments = [build_assessment(result) for result in results]
         
         return RecommendationResponse(recommended_assessments=recommended_assessments)
     
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+def stream_event(event, assessments, skill=None, detail=None):
+    payload = {"event": event}
+    if skill is not None:
+        payload["skill"] = skill
+    if detail is not None:
+        payload["detail"] = detail
+    payload["recommended_assessments"] = jsonable_encoder([build_assessment(result) for result in assessments])
+    return json.dumps(payload) + "\n"
+
+@app.post("/recommend/stream")
+async def stream_recommendations(query: Query, request: Request):
+    # NDJSON: one "skill" line per skill search as it completes, then a
+    # "final" line with the merged ranking that /recommend would return.
+    search_system = request.app.state.search_system
+    key = response_cache.key(query.query, await search_system.acatalog_version())
+    cached = response_cache.get(key) if response_cache_ttl > 0 else None
+
+    async def events():
+        if cached is not None:
+            yield stream_event("final", cached)
+            return
+        try:
+            with search_system.metrics.span("stream_multiple_skills"):
+                async for event, skill, results in search_system.astream_multiple_skills(query.query, final_limit=10):
+                    if event == "final" and results and response_cache_ttl > 0:
+                        response_cache.set(key, results)
+                    yield stream_event(event, results, skill=skill)
+        except Exception as e:
+            yield stream_event("error", [], detail=str(e))
+
+    headers = {"X-Cache": "HIT" if cached is not None else "MISS"}
+    return StreamingResponse(events(), media_type="application/x-ndjson", headers=headers)
+
+def batch_line(item_id, index, results, error=None):
+    payload = {"id": item_id, "index": index}
+    if error is not None:
+        payload["error"] = error
+    payload["recommended_assessments"] = jsonable_encoder([build_assessment(result) for result in results])
+    return json.dumps(payload) + "\n"
+
+def parse_batch_lines(lines):
+    # Accepts {"id", "query"} lines, or {"request_id", "title", "body"}
+    # lines as in a requisition backlog export. Returns the (id, query)
+    # records and the numbers of lines skipped for having no query.
+    records = []
+    skipped = []
+    for line_number, line in enumerate(lines, 1):
+        line = line.strip()
+        if not line:
+            continue
+        record = json.loads(line)
+        query = record.get("query") or "\n".join(
+            part for part in (record.get("title"), record.get("body")) if part
+        )
+        if not query:
+            skipped.append(line_number)
+            continue
+        record_id = record.get("id") or record.get("request_id") or str(line_number)
+        records.append((record_id, query))
+    return records, skipped
+
+@app.post("/recommend/batch")
+async def batch_recommendations(request: Request):
+    # Takes {"queries": [...]} as JSON, or an application/x-ndjson body in
+    # the same format as batch_recommend.py. Streams NDJSON, one line per
+    # query in completion order; "index" is the position in the request.
+    body = await request.body()
+    try:
+        if request.headers.get("content-type", "").startswith("application/x-ndjson"):
+            records, _ = parse_batch_lines(body.decode("utf-8").splitlines())
+        else:
+            batch = BatchQuery.model_validate_json(body)
+            records = [(item.id, item.query) for item in batch.queries]
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=f"invalid batch: {e}")
+    if len(records) > batch_max_queries:
+        raise HTTPException(status_code=413, detail=f"batch exceeds {batch_max_queries} queries")
+    search_system = request.app.state.search_system
+
+    async def lines():
+        async for index, results, error in search_system.abatch_search_multiple_skills(
+                [query for _, query in records], final_limit=10):
+            yield batch_line(records[index][0], index, results, error)
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
 if __name__ == "__main__":
     uvicorn.run(app, host="0.0.0.0", port=8000)
@@ -0,0 +1,35 @@
+import numpy as np
+
+from catalog_snapshot import from_columns, load_snapshot, read_current, to_columns, write_snapshot
+from local_index import LocalVectorIndex
+
+DOCUMENTS = [
+    {"name": "Java 8", "url": "u1", "test_type": ["Knowledge & Skills"], "assessment_length": 30.0},
+    {"name": "OPQ", "url": "u2", "test_type": ["Personality & Behavior"], "assessment_length": None},
+]
+
+
+def test_columns_round_trip_keeps_nulls():
+    assert from_columns(to_columns(DOCUMENTS)) == DOCUMENTS
+
+
+def test_snapshot_round_trip(tmp_path):
+    embeddings = np.eye(2, 4, dtype=np.float32)
+    version = write_snapshot(str(tmp_path), embeddings, DOCUMENTS, model_name="test-model")
+    assert read_current(str(tmp_path)) == version
+
+    matrix, documents, manifest = load_snapshot(str(tmp_path), verify=True)
+    assert documents == DOCUMENTS
+    assert np.array_equal(matrix, embeddings)
+    assert manifest["count"] == 2
+
+    # Same content, same version.
+    assert write_snapshot(str(tmp_path), embeddings, DOCUMENTS, model_name="test-model") == version
+
+
+def test_index_from_snapshot_returns_null_length(tmp_path):
+    write_snapshot(str(tmp_path), np.eye(2, 4, dtype=np.float32), DOCUMENTS)
+    index = LocalVectorIndex.from_snapshot(str(tmp_path))
+    result = index.search(np.array([0, 1, 0, 0], dtype=np.float32), 1)[0]
+    assert result["name"] == "OPQ"
+    assert result["assessment_length"] is None
@@ -0,0 +1,60 @@
+import pytest
+
+from query_parser import QueryParser
+
+
+@pytest.fixture
+def parser():
+    return QueryParser()
+
+
+@pytest.mark.parametrize("query, length", [
+    ("Java test under 40 minutes", "<=40"),
+    ("about an hour", "<=60"),
+    ("1 hour 30 minutes", "<=90"),
+    ("1.5 hrs", "<=90"),
+    ("At least an hour", ">=60"),
+    ("more than 45 minutes", ">=45"),
+    ("30-40 mins", "30-40"),
+    ("1-2 hours", "60-120"),
+    ("between 30 and 60 minutes", "30-60"),
+    ("between 30 minutes to an hour", "30-60"),
+    ("1 hour - 90 minutes", "60-90"),
+    ("Assessment Length: >=20", ">=20"),
+    ("Python developer", None),
+])
+def test_parse_length(parser, query, length):
+    assert parser.parse_length(query) == length
+
+
+def test_unrelated_durations_are_ambiguous(parser):
+    parsed = parser.parse("a 20 minute test and a 1 hour interview")
+    assert parsed["ambiguous"]
+    assert not parser.parse("between 30 minutes to an hour")["ambiguous"]
+
+
+@pytest.mark.parametrize("query", [
+    "Sales lead for international clients",
+    "Accountant for internal audit",
+])
+def test_job_level_keywords_match_whole_words(parser, query):
+    assert parser.parse(query)["job_levels"] == []
+
+
+def test_job_level_keywords_match_plurals(parser):
+    assert parser.parse("hiring interns and managers")["job_levels"] == ["Entry-Level", "Manager"]
+
+
+def test_generic_words_do_not_infer_test_types(parser):
+    assert parser.parse("Java developer with the ability to work in a team")["test_types"] == []
+    assert parser.parse("numerical reasoning and a personality test")["test_types"] == [
+        "Ability & Aptitude", "Personality & Behavior"
+    ]
+
+
+def test_languages_from_catalog_documents():
+    parser = QueryParser.from_documents([
+        {"languages": ["English (USA)", "English International"]},
+        {"languages": ["Spanish"]},
+    ])
+    assert parser.parse("sales role, English speaking")["languages"] == ["English (USA)", "English International"]
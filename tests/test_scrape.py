@@ -0,0 +1,136 @@
+import asyncio
+import functools
+import os
+import threading
+import urllib.request
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from scrape import ScrapeState, parse_product_details, read_records, run_scrape_pool, scrape_product_details
+
+FIXTURES = os.path.join(os.path.dirname(__file__), "fixtures")
+
+
+def read_fixture(name):
+    with open(os.path.join(FIXTURES, name), "r", encoding="utf-8") as f:
+        return f.read()
+
+
+@pytest.fixture
+def fixture_server():
+    class QuietHandler(SimpleHTTPRequestHandler):
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), functools.partial(QuietHandler, directory=FIXTURES))
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+    server.server_close()
+
+
+class FetchPage:
+    # The subset of a Playwright page used by scrape_product_details, backed
+    # by plain HTTP so the pool can run without a browser install.
+    async def goto(self, url):
+        def fetch():
+            with urllib.request.urlopen(url, timeout=10) as response:
+                return response.read().decode("utf-8")
+        self.html = await asyncio.to_thread(fetch)
+
+    async def wait_for_selector(self, selector, timeout=None):
+        pass
+
+    async def content(self):
+        return self.html
+
+
+class FetchContext:
+    async def new_page(self):
+        return FetchPage()
+
+    async def close(self):
+        pass
+
+
+class FetchBrowser:
+    async def new_context(self):
+        return FetchContext()
+
+
+def details_handler(snapshot_dir):
+    async def handler(page, url):
+        details = await scrape_product_details(page, url, snapshot_dir)
+        details['URL'] = url
+        return [details]
+    return handler
+
+
+def test_parse_product_details():
+    details = parse_product_details(read_fixture("product_java.html"))
+    assert details == {
+        'Description': "Multi-choice test that measures the knowledge of basic Java constructs, "
+                       "OOP concepts and exceptions.",
+        'Job Levels': "Entry-Level, Graduate,",
+        'Languages': "English (USA),",
+        'Assessment Length': "13",
+    }
+
+
+def test_parse_product_details_missing_values():
+    details = parse_product_details(read_fixture("product_opq.html"))
+    assert details['Job Levels'] == "Not available"
+    assert details['Assessment Length'] == "Untimed"
+    assert 'Languages' not in details
+
+
+def test_scrape_pool_against_served_fixtures(tmp_path, fixture_server):
+    urls = [f"{fixture_server}/product_java.html", f"{fixture_server}/product_opq.html",
+            f"{fixture_server}/missing.html"]
+    state_path = str(tmp_path / "state.db")
+    output_path = str(tmp_path / "details.jsonl")
+    snapshot_dir = str(tmp_path / "snapshots")
+
+    asyncio.run(run_scrape_pool(urls, details_handler(snapshot_dir), state_path, output_path,
+                                concurrency=2, requests_per_second=100.0, max_attempts=1,
+                                browser=FetchBrowser()))
+
+    records = {record['URL']: record for record in read_records(output_path, 'URL')}
+    assert set(records) == set(urls[:2])
+    assert records[urls[0]]['Assessment Length'] == "13"
+    assert records[urls[1]]['Job Levels'] == "Not available"
+    assert len(os.listdir(snapshot_dir)) == 3  # two pages plus index.jsonl
+
+    # The failed URL is recorded and, with max_attempts=1, not retried.
+    state = ScrapeState(state_path)
+    assert state.pending(max_attempts=1) == []
+    assert state.pending(max_attempts=2) == [urls[2]]
+    state.close()
+
+    # A resumed run has nothing left to fetch.
+    asyncio.run(run_scrape_pool(urls, details_handler(snapshot_dir), state_path, output_path,
+                                max_attempts=1, browser=FetchBrowser()))
+    assert len(read_records(output_path, 'URL')) == 2
+
+
+def test_scrape_pool_with_chromium(tmp_path, fixture_server):
+    playwright_api = pytest.importorskip("playwright.async_api")
+
+    async def run():
+        async with playwright_api.async_playwright() as playwright:
+            try:
+                browser = await playwright.chromium.launch()
+            except Exception as e:
+                pytest.skip(f"Chromium is not installed: {e}")
+            try:
+                await run_scrape_pool([f"{fixture_server}/product_java.html"], details_handler(None),
+                                      str(tmp_path / "state.db"), str(tmp_path / "details.jsonl"),
+                                      requests_per_second=100.0, browser=browser)
+            finally:
+                await browser.close()
+
+    asyncio.run(run())
+    records = read_records(str(tmp_path / "details.jsonl"), 'URL')
+    assert records[0]['Assessment Length'] == "13"